@@ -0,0 +1,36 @@
+import math
+
+import numpy as np
+from numba import guvectorize
+
+@guvectorize(["void(float64[:], float64[:])", "void(float32[:], float32[:])"], "(n)->()", nopython=True, cache=True)
+def max_drawdown(returns, out):
+    """
+    Maximum peak-to-trough drawdown of a return series, in a single pass.
+    
+    Compounding is tracked in log space, so each step is an addition and the
+    drawdown from the running peak is expm1 of the distance to the peak log
+    value. Broadcasts over leading axes, so pass the time axis last
+    (e.g. an (n_scenarios, n_obs) array for several series at once).
+    Missing returns are skipped, as pandas' cumprod and min skip them.
+    
+    Args:
+        returns: Series of simple returns
+        out: Maximum drawdown as a non-positive fraction (NaN for a series
+            without any valid return)
+    """
+    log_value = 0.0
+    log_peak = -np.inf
+    drawdown = 0.0
+    n_valid = 0
+    for i in range(returns.shape[0]):
+        if math.isnan(returns[i]):
+            continue
+        n_valid += 1
+        log_value += math.log1p(returns[i])
+        if log_value > log_peak:
+            log_peak = log_value
+        current = math.expm1(log_value - log_peak)
+        if current < drawdown:
+            drawdown = current
+    out[0] = drawdown if n_valid > 0 else np.nan
@@ -1,28 +1,86 @@
-import logging
 import yfinance as yf
 import pandas as pd
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import hashlib
 import os
+import time
 
-from src.config.settings import CACHE_DIR, LOG_DIR
+from src.config.settings import CACHE_DIR
+from src.tools.cache import FileCache
+from src.logging_setup import get_logger
 
-# Set up logging
-os.makedirs(LOG_DIR, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(LOG_DIR, 'data_aggregation.log'),
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__, 'data_aggregation.log')
+
+# Maximum age (in seconds) of a cached price file before it is refetched,
+# keyed by bar interval. Intraday bars go stale much faster than daily ones.
+CACHE_TTL_SECONDS = {
+    "1m": 60,
+    "2m": 120,
+    "5m": 300,
+    "15m": 900,
+    "30m": 1800,
+    "60m": 3600,
+    "90m": 3600,
+    "1h": 3600,
+    "1d": 86400,
+    "5d": 86400,
+    "1wk": 86400,
+    "1mo": 86400,
+    "3mo": 86400
+}
+DEFAULT_CACHE_TTL_SECONDS = 86400
+
+# Ticker metadata and dividends change rarely, so they are memoized per process
+INFO_CACHE_TTL_SECONDS = 3600
+
+# Maximum age (in seconds) of an info file on disk, shared across processes
+INFO_FILE_CACHE_TTL_SECONDS = 86400
+
+def _ttl_bucket(ttl: int) -> int:
+    """Return the current time bucket; memoized entries expire when it rolls over."""
+    return int(time.time() // ttl)
+
+@lru_cache(maxsize=512)
+def _yf_ticker(ticker: str, ttl_bucket: int) -> yf.Ticker:
+    """
+    Return a shared yfinance Ticker for a ticker within one TTL bucket.
+    
+    Ticker objects keep their info and dividend lookups internally, so a new
+    one is created when the bucket rolls over rather than reusing it forever.
+    """
+    return yf.Ticker(ticker)
+
+@lru_cache(maxsize=512)
+def _ticker_info(ticker: str, ttl_bucket: int) -> Dict:
+    """Fetch and memoize yfinance info for a ticker within one TTL bucket."""
+    return _yf_ticker(ticker, ttl_bucket).info
+
+@lru_cache(maxsize=512)
+def _ticker_dividends(ticker: str, ttl_bucket: int) -> pd.Series:
+    """Fetch and memoize yfinance dividend history for a ticker within one TTL bucket."""
+    return _yf_ticker(ticker, ttl_bucket).dividends
 
 class DataAggregationAgent:
     def __init__(self):
         """Initialize the Data Aggregation Agent."""
         self.cache_dir = CACHE_DIR
-        os.makedirs(self.cache_dir, exist_ok=True)
+        self.info_cache = FileCache(self.cache_dir, INFO_FILE_CACHE_TTL_SECONDS)
         logger.info("Data Aggregation Agent initialized")
 
+    def _cache_key(self, ticker: str, period: str, interval: str) -> str:
+        """Build a filesystem-safe cache key for a ticker/period/interval request."""
+        return hashlib.blake2b(f"{ticker}|{period}|{interval}".encode(), digest_size=16).hexdigest()
+
+    def _is_cache_fresh(self, cache_file: str, interval: str) -> bool:
+        """Check whether a cache file exists and is younger than the interval's TTL."""
+        if not os.path.exists(cache_file):
+            return False
+        ttl = CACHE_TTL_SECONDS.get(interval, DEFAULT_CACHE_TTL_SECONDS)
+        return time.time() - os.path.getmtime(cache_file) < ttl
+
     def fetch_stock_data(
         self,
         ticker: str,
@@ -37,23 +95,36 @@ class DataAggregationAgent:
             ticker: Stock ticker symbol
             period: Time period to fetch (e.g., "1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "ytd", "max")
             interval: Data interval (e.g., "1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h", "1d", "5d", "1wk", "1mo", "3mo")
-            force_refresh: Whether to force a refresh of the data instead of using cached data
+            force_refresh: Whether to force a refresh of the data instead of using cached data.
+                Cached data older than the interval's TTL is always refreshed.
             
         Returns:
             DataFrame containing the stock data
         """
-        cache_file = os.path.join(self.cache_dir, f"{ticker}_{period}_{interval}.csv")
+        cache_file = os.path.join(self.cache_dir, f"{self._cache_key(ticker, period, interval)}.parquet")
+        legacy_cache_file = os.path.join(self.cache_dir, f"{ticker}_{period}_{interval}.csv")
         
-        if not force_refresh and os.path.exists(cache_file):
+        if not force_refresh and self._is_cache_fresh(cache_file, interval):
             try:
-                data = pd.read_csv(cache_file, index_col=0, parse_dates=True)
+                data = pd.read_parquet(cache_file)
                 logger.info(f"Loaded cached data for {ticker}")
                 return data
             except Exception as e:
                 logger.warning(f"Error loading cached data for {ticker}: {str(e)}")
         
+        if not force_refresh and self._is_cache_fresh(legacy_cache_file, interval):
+            try:
+                # Migrate caches written before the switch to parquet
+                data = pd.read_csv(legacy_cache_file, index_col=0, parse_dates=True)
+                data.to_parquet(cache_file, compression='snappy')
+                os.remove(legacy_cache_file)
+                logger.info(f"Migrated cached data for {ticker} to parquet")
+                return data
+            except Exception as e:
+                logger.warning(f"Error migrating cached data for {ticker}: {str(e)}")
+        
         try:
-            stock = yf.Ticker(ticker)
+            stock = _yf_ticker(ticker, _ttl_bucket(INFO_CACHE_TTL_SECONDS))
             data = stock.history(period=period, interval=interval)
             
             if data.empty:
@@ -61,7 +132,7 @@ class DataAggregationAgent:
                 return pd.DataFrame()
             
             # Save to cache
-            data.to_csv(cache_file)
+            data.to_parquet(cache_file, compression='snappy')
             logger.info(f"Fetched and cached data for {ticker}")
             
             return data
@@ -78,6 +149,9 @@ class DataAggregationAgent:
         """
         Fetch data for multiple stocks.
         
+        Tickers are fetched concurrently since each download is bound by
+        the network round-trip rather than by CPU.
+        
         Args:
             tickers: List of stock ticker symbols
             period: Time period to fetch
@@ -86,26 +160,52 @@ class DataAggregationAgent:
         Returns:
             Dictionary mapping tickers to their respective DataFrames
         """
-        results = {}
-        for ticker in tickers:
-            data = self.fetch_stock_data(ticker, period, interval)
-            if not data.empty:
-                results[ticker] = data
+        if not tickers:
+            return {}
+        
+        with ThreadPoolExecutor(max_workers=min(16, len(tickers))) as executor:
+            frames = executor.map(
+                lambda ticker: self.fetch_stock_data(ticker, period, interval),
+                tickers
+            )
+            results = {
+                ticker: data
+                for ticker, data in zip(tickers, frames)
+                if not data.empty
+            }
         return results
 
-    def get_stock_info(self, ticker: str) -> Dict:
+    def get_stock_info(self, ticker: str, force_refresh: bool = False) -> Dict:
         """
         Get detailed information about a stock.
         
+        Info is persisted as JSON in the cache directory so that later runs
+        and other processes can skip the request while it is fresh.
+        
         Args:
             ticker: Stock ticker symbol
+            force_refresh: Whether to force a refresh of the info instead of using cached info
             
         Returns:
             Dictionary containing stock information
         """
+        cache_key = f"info_{ticker}"
+        
+        if not force_refresh:
+            info = self.info_cache.get(cache_key)
+            if info is not None:
+                logger.info(f"Loaded cached info for {ticker}")
+                return info
+        
         try:
-            stock = yf.Ticker(ticker)
-            info = stock.info
+            if force_refresh:
+                # Bypass the memoized Ticker, which would return its stored info
+                info = yf.Ticker(ticker).info
+            else:
+                info = _ticker_info(ticker, _ttl_bucket(INFO_CACHE_TTL_SECONDS))
+            info = dict(info)
+            self.info_cache.set(cache_key, info)
+            
             logger.info(f"Retrieved info for {ticker}")
             return info
         except Exception as e:
@@ -123,10 +223,9 @@ class DataAggregationAgent:
             DataFrame containing dividend history
         """
         try:
-            stock = yf.Ticker(ticker)
-            dividends = stock.dividends
+            dividends = _ticker_dividends(ticker, _ttl_bucket(INFO_CACHE_TTL_SECONDS))
             logger.info(f"Retrieved dividends for {ticker}")
-            return dividends
+            return dividends.copy()
         except Exception as e:
             logger.error(f"Error getting dividends for {ticker}: {str(e)}")
             return pd.DataFrame()
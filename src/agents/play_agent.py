@@ -1,166 +1,392 @@
-import logging
+import asyncio
+import heapq
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Optional, Tuple
-import os
+from numba import njit
+from typing import Callable, Dict, List, Optional, Tuple
+from collections import deque
 from datetime import datetime, timedelta
 
-from src.config.settings import CACHE_DIR, LOG_DIR, RISK_PER_TRADE
+from src.config.settings import CACHE_DIR, RISK_PER_TRADE
 from src.agents.data_aggregation_agent import DataAggregationAgent
 from src.agents.research_agent import ResearchAgent
 from src.agents.strategy_agent import StrategyAgent
 from src.agents.risk_agent import RiskAgent
+from src.logging_setup import get_logger
 
-# Set up logging
-os.makedirs(LOG_DIR, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(LOG_DIR, 'play_agent.log'),
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__, 'play_agent.log')
+
+# Working precision for price matrices handed to the feature kernels
+_DTYPE = np.float32
+
+@njit(cache=True)
+def _compute_ticker_features(close: np.ndarray, rsi_window: int = 14):
+    """
+    Compute the latest close, MA20, MA50, RSI and annualized volatility in one pass.
+    
+    The moving averages sum the trailing windows, RSI keeps Wilder running
+    averages and volatility uses Welford's online variance, so the close
+    array is read exactly once and no intermediate arrays are allocated.
+    """
+    n = close.shape[0]
+    if n == 0:
+        return np.nan, np.nan, np.nan, np.nan, np.nan
+    sum20 = 0.0
+    sum50 = 0.0
+    avg_gain = 0.0
+    avg_loss = 0.0
+    count = 0
+    mean = 0.0
+    m2 = 0.0
+    for i in range(n):
+        price = close[i]
+        if i >= n - 20:
+            sum20 += price
+        if i >= n - 50:
+            sum50 += price
+        if i == 0:
+            continue
+        
+        # Wilder averages, seeded with the mean of the first rsi_window changes
+        delta = price - close[i - 1]
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        if i <= rsi_window:
+            avg_gain += gain / rsi_window
+            avg_loss += loss / rsi_window
+        else:
+            avg_gain = (avg_gain * (rsi_window - 1) + gain) / rsi_window
+            avg_loss = (avg_loss * (rsi_window - 1) + loss) / rsi_window
+        
+        # Welford's online variance of simple returns, skipping missing prices
+        r = price / close[i - 1] - 1.0
+        if not np.isnan(r):
+            count += 1
+            d = r - mean
+            mean += d / count
+            m2 += d * (r - mean)
+    
+    ma20 = sum20 / 20 if n >= 20 else np.nan
+    ma50 = sum50 / 50 if n >= 50 else np.nan
+    rsi = np.nan
+    if n > rsi_window:
+        if avg_loss > 0:
+            rsi = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+        elif avg_gain > 0:
+            rsi = 100.0
+    volatility = np.sqrt(m2 / (count - 1)) * np.sqrt(252.0) if count > 1 else np.nan
+    return close[n - 1], ma20, ma50, rsi, volatility
+
+@njit(cache=True)
+def _compute_universe_features(close_matrix: np.ndarray) -> np.ndarray:
+    """
+    Apply _compute_ticker_features to every column of an (n_bars, n_tickers) matrix.
+    
+    Missing values introduced by aligning tickers on a shared index are
+    dropped per column, so each ticker sees only its own price history.
+    The loop is serial: a universe is tens of tickers, and the kernel runs
+    on a worker thread, where numba's parallel (TBB) threading layer keeps
+    the process from exiting.
+    Accepts float32 or float64 prices; running sums are kept in float64.
+    Returns an (n_tickers, 5) float64 array of close, MA20, MA50, RSI and volatility.
+    """
+    n_bars, n_tickers = close_matrix.shape
+    features = np.empty((n_tickers, 5))
+    for j in range(n_tickers):
+        column = close_matrix[:, j]
+        prices = column[~np.isnan(column)]
+        last_close, ma20, ma50, rsi, volatility = _compute_ticker_features(prices)
+        features[j, 0] = last_close
+        features[j, 1] = ma20
+        features[j, 2] = ma50
+        features[j, 3] = rsi
+        features[j, 4] = volatility
+    return features
+
+def _last_valid(matrix: np.ndarray) -> np.ndarray:
+    """Last non-NaN value of each column of a 2-D array (NaN if a column has none)."""
+    last = np.full(matrix.shape[1], np.nan)
+    if matrix.shape[0] == 0:
+        return last
+    has_value = ~np.isnan(matrix)
+    rows = matrix.shape[0] - 1 - has_value[::-1].argmax(axis=0)
+    found = has_value.any(axis=0)
+    last[found] = matrix[rows[found], np.flatnonzero(found)]
+    return last
+
+def build_close_matrix(universe_data: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Stack each ticker's close prices into one (n_bars, n_tickers) frame on a shared index."""
+    return pd.DataFrame({ticker: data['Close'] for ticker, data in universe_data.items()})
+
+class StreamingSMA:
+    """Simple moving average updated in O(1) per new price."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self.buffer = deque(maxlen=window)
+        self.total = 0.0
+
+    def update(self, price: float) -> float:
+        """Add a price and return the current average (NaN until the window is full)."""
+        if len(self.buffer) == self.window:
+            self.total -= self.buffer[0]
+        self.buffer.append(price)
+        self.total += price
+        if len(self.buffer) < self.window:
+            return np.nan
+        return self.total / self.window
+
+class StreamingRSI:
+    """Wilder-smoothed RSI updated in O(1) per new price, matching _compute_ticker_features."""
+
+    def __init__(self, window: int = 14):
+        self.window = window
+        self.prev_price = None
+        self.count = 0
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    def update(self, price: float) -> float:
+        """Add a price and return the current RSI (NaN until a full window of changes)."""
+        if self.prev_price is None:
+            self.prev_price = price
+            return np.nan
+        delta = price - self.prev_price
+        self.prev_price = price
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        self.count += 1
+        if self.count <= self.window:
+            # Seed with the simple mean of the first window changes
+            self.avg_gain += gain / self.window
+            self.avg_loss += loss / self.window
+            if self.count < self.window:
+                return np.nan
+        else:
+            self.avg_gain = (self.avg_gain * (self.window - 1) + gain) / self.window
+            self.avg_loss = (self.avg_loss * (self.window - 1) + loss) / self.window
+        if self.avg_loss == 0:
+            return 100.0 if self.avg_gain > 0 else np.nan
+        return 100 - (100 / (1 + self.avg_gain / self.avg_loss))
 
 class PlayAgent:
-    def __init__(self):
-        """Initialize the Play Agent."""
-        self.data_agent = DataAggregationAgent()
+    def __init__(self, data_agent: Optional[DataAggregationAgent] = None):
+        """
+        Initialize the Play Agent.
+        
+        Args:
+            data_agent: Data aggregation agent to fetch data through, shared with the
+                strategy and risk agents. A new one is created if omitted.
+        """
+        self.data_agent = data_agent or DataAggregationAgent()
         self.research_agent = ResearchAgent()
-        self.strategy_agent = StrategyAgent()
-        self.risk_agent = RiskAgent()
+        self.strategy_agent = StrategyAgent(self.data_agent)
+        self.risk_agent = RiskAgent(self.data_agent)
         self.cache_dir = CACHE_DIR
-        os.makedirs(self.cache_dir, exist_ok=True)
+        self._live_indicators: Dict[str, Dict] = {}
         logger.info("Play Agent initialized")
 
-    def generate_trade_recommendations(
+    def seed_live_indicators(self, ticker: str, prices: pd.Series) -> Dict[str, float]:
+        """
+        Reset the streaming indicator state for a ticker from its price history.
+        
+        Args:
+            ticker: Stock ticker symbol
+            prices: Historical close prices, oldest first
+            
+        Returns:
+            Dictionary containing the latest price, MA20, MA50 and RSI
+        """
+        self._live_indicators.pop(ticker, None)
+        latest = {}
+        for price in prices.to_numpy(dtype=np.float64):
+            latest = self.update_live_indicators(ticker, price)
+        return latest
+
+    def update_live_indicators(self, ticker: str, price: float) -> Dict[str, float]:
+        """
+        Update a ticker's streaming indicators with a new price in O(1).
+        
+        Args:
+            ticker: Stock ticker symbol
+            price: Latest close price
+            
+        Returns:
+            Dictionary containing the latest price, MA20, MA50 and RSI
+        """
+        state = self._live_indicators.get(ticker)
+        if state is None:
+            state = {'ma20': StreamingSMA(20), 'ma50': StreamingSMA(50), 'rsi': StreamingRSI(14)}
+            self._live_indicators[ticker] = state
+        return {
+            'price': price,
+            'ma20': state['ma20'].update(price),
+            'ma50': state['ma50'].update(price),
+            'rsi': state['rsi'].update(price)
+        }
+
+    async def generate_trade_recommendations(
         self,
         universe_data: Dict[str, pd.DataFrame],
         risk_tolerance: str = 'medium',
         time_horizon: str = 'medium',
-        max_positions: int = 5
+        max_positions: int = 5,
+        on_recommendations: Optional[Callable[[Dict], None]] = None,
+        closes: Optional[pd.DataFrame] = None,
+        returns: Optional[pd.DataFrame] = None
     ) -> Dict:
         """
         Generate trade recommendations based on research and analysis.
         
+        The LLM research report is requested concurrently with the indicator
+        and risk computation, which runs in a worker thread.
+        
         Args:
             universe_data: Dictionary mapping tickers to their data
             risk_tolerance: Risk tolerance level ('low', 'medium', 'high')
             time_horizon: Investment time horizon ('short', 'medium', 'long')
             max_positions: Maximum number of positions to recommend
+            on_recommendations: Called with the recommendations as soon as they are
+                computed, before the research report has arrived
+            closes: Close matrix of universe_data from build_close_matrix, if the
+                caller already has it
+            returns: Returns of closes with missing rows dropped, if the caller
+                already has them
             
         Returns:
-            Dictionary containing trade recommendations
+            Dictionary containing trade recommendations; its research_report
+            is None if the report could not be generated
         """
+        research_task = asyncio.create_task(self.research_agent.generate_research_report(universe_data))
         try:
-            # Get research analysis
-            research_report = self.research_agent.generate_research_report(universe_data)
+            result = await asyncio.to_thread(
+                self._build_recommendations,
+                universe_data,
+                risk_tolerance,
+                time_horizon,
+                max_positions,
+                closes,
+                returns
+            )
+            if on_recommendations is not None:
+                on_recommendations(result)
             
-            # Get risk metrics
-            returns = pd.DataFrame()
-            for ticker, data in universe_data.items():
-                returns[ticker] = data['Close'].pct_change()
-            returns = returns.dropna()
+            # A failed report should not cost the recommendations already computed
+            try:
+                result['research_report'] = await research_task
+            except Exception as e:
+                logger.warning(f"Research report unavailable for trade recommendations: {str(e)}")
+                result['research_report'] = None
             
-            portfolio_risk = self.risk_agent.calculate_portfolio_risk(returns)
-            correlation_matrix = self.risk_agent.calculate_correlation_matrix(returns)
-            
-            # Generate recommendations
-            recommendations = []
-            for ticker, data in universe_data.items():
-                # Get stock info
-                info = self.data_agent.get_stock_info(ticker)
-                
-                # Calculate technical indicators
-                data['Returns'] = data['Close'].pct_change()
-                data['MA20'] = data['Close'].rolling(window=20).mean()
-                data['MA50'] = data['Close'].rolling(window=50).mean()
-                data['RSI'] = self._calculate_rsi(data['Close'])
-                
-                # Generate signals
-                momentum_signal = self._generate_momentum_signal(data)
-                mean_reversion_signal = self._generate_mean_reversion_signal(data)
-                
-                # Calculate risk metrics
-                volatility = data['Returns'].std() * np.sqrt(252)
-                beta = self.risk_agent.calculate_beta(
-                    data['Returns'],
-                    returns.mean(axis=1)  # Use average market returns as proxy
-                )
-                
-                # Determine recommendation
-                recommendation = self._determine_recommendation(
-                    momentum_signal,
-                    mean_reversion_signal,
-                    volatility,
-                    beta,
-                    risk_tolerance,
-                    time_horizon
-                )
-                
-                if recommendation['action'] != 'HOLD':
-                    recommendations.append({
-                        'ticker': ticker,
-                        'action': recommendation['action'],
-                        'reason': recommendation['reason'],
-                        'price': data['Close'].iloc[-1],
-                        'volatility': volatility,
-                        'beta': beta,
-                        'rsi': data['RSI'].iloc[-1],
-                        'momentum_signal': momentum_signal,
-                        'mean_reversion_signal': mean_reversion_signal
-                    })
-            
-            # Sort and filter recommendations
-            recommendations = sorted(
-                recommendations,
-                key=lambda x: (
-                    1 if x['action'] == 'BUY' else 0,
-                    -x['volatility'] if risk_tolerance == 'low' else x['volatility']
-                ),
-                reverse=True
-            )[:max_positions]
-            
-            # Calculate position sizes
-            for rec in recommendations:
-                rec['position_size'] = self._calculate_position_size(
-                    rec['volatility'],
-                    risk_tolerance,
-                    RISK_PER_TRADE
-                )
-            
-            result = {
-                'timestamp': datetime.now().isoformat(),
-                'risk_tolerance': risk_tolerance,
-                'time_horizon': time_horizon,
-                'recommendations': recommendations,
-                'portfolio_risk': portfolio_risk,
-                'correlation_matrix': correlation_matrix.to_dict()
-            }
-            
-            logger.info(f"Generated {len(recommendations)} trade recommendations")
+            logger.info(f"Generated {len(result['recommendations'])} trade recommendations")
             return result
         except Exception as e:
             logger.error(f"Error generating trade recommendations: {str(e)}")
             return {}
+        finally:
+            research_task.cancel()
+
+    def _build_recommendations(
+        self,
+        universe_data: Dict[str, pd.DataFrame],
+        risk_tolerance: str,
+        time_horizon: str,
+        max_positions: int,
+        closes: Optional[pd.DataFrame] = None,
+        returns: Optional[pd.DataFrame] = None
+    ) -> Dict:
+        """Compute indicators, risk metrics and the ranked recommendation list."""
+        # Get risk metrics
+        if closes is None:
+            closes = build_close_matrix(universe_data)
+        if returns is None:
+            returns = closes.pct_change().dropna()
+        
+        portfolio_risk = self.risk_agent.calculate_portfolio_risk(returns)
+        correlation_matrix = self.risk_agent.calculate_correlation_matrix(returns)
+        
+        # Calculate technical indicators and volatility for all tickers at once.
+        # float32 prices halve memory traffic; the kernel accumulates in float64.
+        close_matrix = closes.to_numpy(dtype=np.float64)
+        features = _compute_universe_features(close_matrix.astype(_DTYPE))
+        
+        # Each ticker's latest close at full precision, for signals and the quoted
+        # price; the float32 copy is only the indicator kernel's input
+        last_closes = _last_valid(close_matrix)
+        
+        # Betas against average market returns as proxy for the market
+        betas = self.risk_agent.calculate_betas(returns)
+        
+        # Generate recommendations
+        recommendations = []
+        for ticker, last_close, (_, last_ma20, last_ma50, last_rsi, volatility) in zip(closes.columns, last_closes, features):
+            # Generate signals
+            momentum_signal = self._generate_momentum_signal(last_close, last_ma20, last_ma50)
+            mean_reversion_signal = self._generate_mean_reversion_signal(last_rsi)
+            
+            # Calculate risk metrics
+            beta = betas.get(ticker, 0.0)
+            
+            # Determine recommendation
+            recommendation = self._determine_recommendation(
+                momentum_signal,
+                mean_reversion_signal,
+                volatility,
+                beta,
+                risk_tolerance,
+                time_horizon
+            )
+            
+            if recommendation['action'] != 'HOLD':
+                recommendations.append({
+                    'ticker': ticker,
+                    'action': recommendation['action'],
+                    'reason': recommendation['reason'],
+                    'price': last_close,
+                    'volatility': volatility,
+                    'beta': beta,
+                    'rsi': last_rsi,
+                    'momentum_signal': momentum_signal,
+                    'mean_reversion_signal': mean_reversion_signal
+                })
+        
+        # Keep the top max_positions recommendations
+        recommendations = heapq.nlargest(
+            max_positions,
+            recommendations,
+            key=lambda x: (
+                1 if x['action'] == 'BUY' else 0,
+                -x['volatility'] if risk_tolerance == 'low' else x['volatility']
+            )
+        )
+        
+        # Calculate position sizes
+        for rec in recommendations:
+            rec['position_size'] = self._calculate_position_size(
+                rec['volatility'],
+                risk_tolerance,
+                RISK_PER_TRADE
+            )
+        
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'risk_tolerance': risk_tolerance,
+            'time_horizon': time_horizon,
+            'recommendations': recommendations,
+            'portfolio_risk': portfolio_risk,
+            'correlation_matrix': correlation_matrix.to_dict()
+        }
 
-    def _calculate_rsi(self, prices: pd.Series, window: int = 14) -> pd.Series:
-        """Calculate Relative Strength Index."""
-        delta = prices.diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
-        rs = gain / loss
-        return 100 - (100 / (1 + rs))
-
-    def _generate_momentum_signal(self, data: pd.DataFrame) -> int:
-        """Generate momentum trading signal."""
-        if data['Close'].iloc[-1] > data['MA20'].iloc[-1] and data['MA20'].iloc[-1] > data['MA50'].iloc[-1]:
+    def _generate_momentum_signal(self, close: float, ma20: float, ma50: float) -> int:
+        """Generate momentum trading signal from the latest close and moving averages."""
+        if close > ma20 and ma20 > ma50:
             return 1  # Strong buy
-        elif data['Close'].iloc[-1] < data['MA20'].iloc[-1] and data['MA20'].iloc[-1] < data['MA50'].iloc[-1]:
+        elif close < ma20 and ma20 < ma50:
             return -1  # Strong sell
         return 0  # Neutral
 
-    def _generate_mean_reversion_signal(self, data: pd.DataFrame) -> int:
-        """Generate mean reversion trading signal."""
-        rsi = data['RSI'].iloc[-1]
+    def _generate_mean_reversion_signal(self, rsi: float) -> int:
+        """Generate mean reversion trading signal from the latest RSI."""
         if rsi < 30:
             return 1  # Oversold, buy
         elif rsi > 70:
@@ -226,12 +452,12 @@ if __name__ == "__main__":
     universe_data = agent.data_agent.fetch_multiple_stocks(tickers)
     
     # Generate recommendations
-    recommendations = agent.generate_trade_recommendations(
+    recommendations = asyncio.run(agent.generate_trade_recommendations(
         universe_data,
         risk_tolerance='medium',
         time_horizon='medium',
         max_positions=3
-    )
+    ))
     
     # Print recommendations
     print("\nTrade Recommendations:")
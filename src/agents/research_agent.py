@@ -1,18 +1,21 @@
-import logging
-import os
+import re
 from typing import Dict, Any
+import numpy as np
 import pandas as pd
 from src.llm.base_llm_client import BaseLLMClient
-from src.config.settings import LOG_DIR
+from src.logging_setup import get_logger
 
-# Set up logging
-os.makedirs(LOG_DIR, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(LOG_DIR, 'research_agent.log'),
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__, 'research_agent.log')
+
+# Numbered section headings ("1. ", "2. ", ...) at the start of a line
+_SECTION_PATTERN = re.compile(r'^\s*([1-5])\.\s+', re.MULTILINE)
+_REPORT_SECTIONS = {
+    "1": "market_analysis",
+    "2": "trends",
+    "3": "risk_factors",
+    "4": "opportunities",
+    "5": "recommendations"
+}
 
 class ResearchAgent:
     def __init__(self):
@@ -65,45 +68,57 @@ class ResearchAgent:
         
         return prompt
 
+    def _stack_universe(self, universe_data: Dict[str, pd.DataFrame], window: int) -> np.ndarray:
+        """
+        Stack the last `window` closes of every ticker into one array.
+        
+        Rows are aligned from the end by position rather than by date, so each
+        column holds that ticker's own most recent closes. Shorter histories are
+        NaN-padded at the top.
+        
+        Args:
+            universe_data: Dictionary mapping tickers to their price data
+            window: Number of trailing closes to keep
+            
+        Returns:
+            Array of shape (window, n_tickers)
+        """
+        closes = np.full((window, len(universe_data)), np.nan)
+        for j, data in enumerate(universe_data.values()):
+            tail = data['Close'].to_numpy(dtype=np.float64)[-window:]
+            closes[window - len(tail):, j] = tail
+        return closes
+
     def _extract_universe_metrics(self, universe_data: Dict[str, pd.DataFrame]) -> str:
         """Extract key metrics from the universe data."""
-        metrics = []
-        for ticker, data in universe_data.items():
-            metrics.append(f"\n{ticker}:")
-            metrics.append(f"  - Current Price: {data['Close'].iloc[-1]:.2f}")
-            metrics.append(f"  - 30-day Volatility: {data['Close'].pct_change().std() * 100:.2f}%")
-            metrics.append(f"  - 30-day Return: {((data['Close'].iloc[-1] / data['Close'].iloc[-30]) - 1) * 100:.2f}%")
+        if not universe_data:
+            return ""
+        
+        # Only the last 30 closes are needed for the 30-day figures; compute
+        # them for the whole universe at once instead of ticker by ticker
+        closes = self._stack_universe(universe_data, 30)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            volatility = np.nanstd(np.diff(closes, axis=0) / closes[:-1], axis=0, ddof=1)
+            first = closes[np.isnan(closes).argmin(axis=0), np.arange(closes.shape[1])]
+            period_return = closes[-1] / first - 1
+        
+        metrics = [
+            f"\n{ticker}:\n"
+            f"  - Current Price: {price:.2f}\n"
+            f"  - 30-day Volatility: {vol * 100:.2f}%\n"
+            f"  - 30-day Return: {ret * 100:.2f}%"
+            for ticker, price, vol, ret in zip(universe_data, closes[-1], volatility, period_return)
+        ]
         
         return "\n".join(metrics)
 
     def _parse_research_report(self, report: str) -> Dict[str, Any]:
         """Parse the LLM-generated report into a structured format."""
-        # This is a simplified parser - you might want to implement a more robust one
-        sections = {
-            "market_analysis": "",
-            "trends": "",
-            "risk_factors": "",
-            "opportunities": "",
-            "recommendations": ""
-        }
+        sections = {name: "" for name in _REPORT_SECTIONS.values()}
         
-        current_section = None
-        for line in report.split("\n"):
-            line = line.strip()
-            if not line:
-                continue
-                
-            if "1." in line:
-                current_section = "market_analysis"
-            elif "2." in line:
-                current_section = "trends"
-            elif "3." in line:
-                current_section = "risk_factors"
-            elif "4." in line:
-                current_section = "opportunities"
-            elif "5." in line:
-                current_section = "recommendations"
-            elif current_section:
-                sections[current_section] += line + "\n"
+        # split() yields [preamble, number, body, number, body, ...]
+        parts = _SECTION_PATTERN.split(report)
+        for number, body in zip(parts[1::2], parts[2::2]):
+            sections[_REPORT_SECTIONS[number]] += body.strip() + "\n"
         
-        return sections 
\ No newline at end of file
+        return sections
@@ -1,91 +1,202 @@
-import logging
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Optional, Tuple
-import os
+from typing import Dict, List, Optional, Tuple, Union
 from datetime import datetime, timedelta
 from scipy import stats
 
-from src.config.settings import CACHE_DIR, LOG_DIR
+from src.config.settings import CACHE_DIR
 from src.agents.data_aggregation_agent import DataAggregationAgent
+from src.agents._fast_windows import max_drawdown
+from src.logging_setup import get_logger
 
-# Set up logging
-os.makedirs(LOG_DIR, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(LOG_DIR, 'risk_agent.log'),
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__, 'risk_agent.log')
+
+# Working precision for return matrices. Return-scale data is well within
+# float32 precision, and it halves the memory traffic of the matrix products.
+# Public methods return plain Python floats, whatever the working precision.
+_DTYPE = np.float32
 
 class RiskAgent:
-    def __init__(self):
-        """Initialize the Risk Agent."""
-        self.data_agent = DataAggregationAgent()
+    def __init__(self, data_agent: Optional[DataAggregationAgent] = None):
+        """
+        Initialize the Risk Agent.
+        
+        Args:
+            data_agent: Data aggregation agent to fetch data through; pass a shared
+                one so that agents reuse its caches. A new one is created if omitted.
+        """
+        self.data_agent = data_agent or DataAggregationAgent()
         self.cache_dir = CACHE_DIR
-        os.makedirs(self.cache_dir, exist_ok=True)
         logger.info("Risk Agent initialized")
 
+    def _asset_returns(self, returns: pd.DataFrame) -> np.ndarray:
+        """
+        Asset returns as an array, with missing returns counted as zero.
+        
+        A NaN would otherwise propagate through the matrix products below;
+        zeroing it matches the NaN-skipping (returns * weights).sum(axis=1).
+        """
+        return np.nan_to_num(returns.to_numpy(dtype=_DTYPE), nan=0.0, posinf=np.inf, neginf=-np.inf)
+
+    def _portfolio_returns(self, returns: pd.DataFrame, weights) -> np.ndarray:
+        """Combine asset returns into portfolio returns with a single matrix-vector product."""
+        return self._asset_returns(returns) @ np.asarray(weights, dtype=_DTYPE)
+
+    def _var_es(self, returns: np.ndarray, confidence_level: float) -> Tuple[float, float]:
+        """
+        Historical VaR and Expected Shortfall from a single sort.
+        
+        VaR interpolates linearly between order statistics, as np.percentile
+        does, and ES is the mean of the returns at or below it.
+        
+        Args:
+            returns: Array of returns
+            confidence_level: Confidence level for VaR and ES
+            
+        Returns:
+            Tuple of (VaR, ES)
+        """
+        sorted_returns = np.sort(returns)
+        position = (1 - confidence_level) * (len(sorted_returns) - 1)
+        lower = int(position)
+        upper = min(lower + 1, len(sorted_returns) - 1)
+        var = sorted_returns[lower] + (sorted_returns[upper] - sorted_returns[lower]) * (position - lower)
+        es = sorted_returns[:np.searchsorted(sorted_returns, var, side='right')].mean()
+        return var, es
+
+    def _monte_carlo_var(
+        self,
+        returns: np.ndarray,
+        confidence_level: float,
+        n_sims: int,
+        weights: Optional[List[float]],
+        seed: Optional[int] = None
+    ) -> float:
+        """
+        Monte Carlo VaR from normally distributed simulated returns.
+        
+        A 1-D input is simulated directly. A 2-D (observations x assets) input
+        is simulated as a multivariate normal through the Cholesky factor of
+        its covariance and combined with the portfolio weights.
+        
+        Args:
+            returns: Array of returns, 1-D for one series or 2-D for several assets
+            confidence_level: Confidence level for VaR calculation
+            n_sims: Number of simulated returns
+            weights: Portfolio weights for 2-D input (if None, equal weights are used)
+            seed: Seed for the random draws, for reproducible results
+            
+        Returns:
+            VaR value
+        """
+        rng = np.random.default_rng(seed)
+        
+        if returns.ndim == 1:
+            z = rng.standard_normal(n_sims, dtype=_DTYPE)
+            simulated = z * returns.std(ddof=1) + returns.mean()
+        else:
+            n_assets = returns.shape[1]
+            z = rng.standard_normal((n_sims, n_assets), dtype=_DTYPE)
+            w = np.full(n_assets, 1.0 / n_assets) if weights is None else np.asarray(weights, dtype=np.float64)
+            cholesky = np.linalg.cholesky(np.atleast_2d(np.cov(returns, rowvar=False, dtype=np.float64)))
+            # (z @ L.T + mu) @ w, folded so the simulation is a single matrix-vector product
+            simulated = z @ (cholesky.T @ w).astype(_DTYPE) + returns.mean(axis=0) @ w
+        
+        return np.percentile(simulated, (1 - confidence_level) * 100)
+
     def calculate_var(
         self,
-        returns: pd.Series,
+        returns: Union[pd.Series, pd.DataFrame, np.ndarray],
         confidence_level: float = 0.95,
-        method: str = 'historical'
+        method: str = 'historical',
+        n_sims: int = 100_000,
+        weights: Optional[List[float]] = None,
+        seed: Optional[int] = None
     ) -> float:
         """
         Calculate Value at Risk (VaR) using different methods.
         
         Args:
-            returns: Series of returns
+            returns: Series or array of returns; 'monte_carlo' also accepts a
+                DataFrame of asset returns together with `weights`
             confidence_level: Confidence level for VaR calculation
             method: Method to use ('historical', 'parametric', or 'monte_carlo')
+            n_sims: Number of simulations for 'monte_carlo'
+            weights: Portfolio weights for 'monte_carlo' with asset returns
+                (if None, equal weights are used)
+            seed: Seed for 'monte_carlo', for reproducible results
             
         Returns:
             VaR value
         """
         try:
+            returns = np.asarray(returns, dtype=_DTYPE)
             if method == 'historical':
                 # Historical VaR
-                var = np.percentile(returns, (1 - confidence_level) * 100)
+                var, _ = self._var_es(returns, confidence_level)
             elif method == 'parametric':
                 # Parametric VaR (assuming normal distribution)
                 mean = returns.mean()
-                std = returns.std()
+                std = returns.std(ddof=1)
                 var = stats.norm.ppf(1 - confidence_level, mean, std)
+            elif method == 'monte_carlo':
+                var = self._monte_carlo_var(returns, confidence_level, n_sims, weights, seed)
             else:
                 raise ValueError(f"Unknown VaR method: {method}")
             
             logger.info(f"Calculated {method} VaR at {confidence_level} confidence level")
-            return var
+            return float(var)
         except Exception as e:
             logger.error(f"Error calculating VaR: {str(e)}")
             return 0.0
 
     def calculate_expected_shortfall(
         self,
-        returns: pd.Series,
+        returns: Union[pd.Series, np.ndarray],
         confidence_level: float = 0.95
     ) -> float:
         """
         Calculate Expected Shortfall (ES) or Conditional VaR.
         
         Args:
-            returns: Series of returns
+            returns: Series or array of returns
             confidence_level: Confidence level for ES calculation
             
         Returns:
             ES value
         """
         try:
-            var = self.calculate_var(returns, confidence_level, 'historical')
-            es = returns[returns <= var].mean()
+            _, es = self._var_es(np.asarray(returns, dtype=_DTYPE), confidence_level)
             
             logger.info(f"Calculated Expected Shortfall at {confidence_level} confidence level")
-            return es
+            return float(es)
         except Exception as e:
             logger.error(f"Error calculating Expected Shortfall: {str(e)}")
             return 0.0
 
+    def _portfolio_risk(self, returns: pd.DataFrame, weights: Optional[List[float]]) -> Dict:
+        """Portfolio risk metrics without error handling; see calculate_portfolio_risk."""
+        if weights is None:
+            weights = [1.0 / len(returns.columns)] * len(returns.columns)
+        
+        # Calculate portfolio returns
+        portfolio_returns = self._portfolio_returns(returns, weights)
+        
+        # Calculate risk metrics; the standard deviation is shared by
+        # volatility and the Sharpe ratio
+        std = portfolio_returns.std(ddof=1)
+        volatility = std * np.sqrt(252)  # Annualized
+        var_95, es_95 = self._var_es(portfolio_returns, 0.95)
+        
+        results = {
+            'volatility': volatility,
+            'var_95': var_95,
+            'es_95': es_95,
+            'max_drawdown': max_drawdown(portfolio_returns),
+            'sharpe_ratio': portfolio_returns.mean() / std * np.sqrt(252)
+        }
+        return results
+
     def calculate_portfolio_risk(
         self,
         returns: pd.DataFrame,
@@ -102,37 +213,28 @@ class RiskAgent:
             Dictionary containing portfolio risk metrics
         """
         try:
-            if weights is None:
-                weights = [1.0 / len(returns.columns)] * len(returns.columns)
-            
-            # Calculate portfolio returns
-            portfolio_returns = (returns * weights).sum(axis=1)
-            
-            # Calculate risk metrics
-            volatility = portfolio_returns.std() * np.sqrt(252)  # Annualized
-            var_95 = self.calculate_var(portfolio_returns, 0.95)
-            es_95 = self.calculate_expected_shortfall(portfolio_returns, 0.95)
-            
-            # Calculate drawdown
-            cumulative_returns = (1 + portfolio_returns).cumprod()
-            peak = cumulative_returns.expanding().max()
-            drawdown = (cumulative_returns - peak) / peak
-            max_drawdown = drawdown.min()
-            
-            results = {
-                'volatility': volatility,
-                'var_95': var_95,
-                'es_95': es_95,
-                'max_drawdown': max_drawdown,
-                'sharpe_ratio': portfolio_returns.mean() / portfolio_returns.std() * np.sqrt(252)
-            }
-            
+            results = self._portfolio_risk(returns, weights)
             logger.info("Calculated portfolio risk metrics")
-            return results
+            return {metric: float(value) for metric, value in results.items()}
         except Exception as e:
             logger.error(f"Error calculating portfolio risk: {str(e)}")
             return {}
 
+    def _correlation_matrix(self, returns: pd.DataFrame) -> pd.DataFrame:
+        """Correlation matrix without error handling; see calculate_correlation_matrix."""
+        values = returns.to_numpy(dtype=_DTYPE)
+        if np.isnan(values).any():
+            # np.corrcoef has no pairwise NaN handling, so let pandas drop them;
+            # cast so that both paths return the working precision
+            correlation_matrix = returns.corr().astype(_DTYPE)
+        else:
+            correlation_matrix = pd.DataFrame(
+                np.corrcoef(values, rowvar=False, dtype=_DTYPE).reshape(len(returns.columns), -1),
+                index=returns.columns,
+                columns=returns.columns
+            )
+        return correlation_matrix
+
     def calculate_correlation_matrix(
         self,
         returns: pd.DataFrame
@@ -147,7 +249,7 @@ class RiskAgent:
             Correlation matrix
         """
         try:
-            correlation_matrix = returns.corr()
+            correlation_matrix = self._correlation_matrix(returns)
             logger.info("Calculated correlation matrix")
             return correlation_matrix
         except Exception as e:
@@ -170,17 +272,79 @@ class RiskAgent:
             Beta value
         """
         try:
-            # Calculate covariance and variance
-            covariance = asset_returns.cov(market_returns)
-            market_variance = market_returns.var()
-            
-            beta = covariance / market_variance
+            # Same computation as calculate_betas, for a single asset
+            beta = self._betas(asset_returns.to_frame(), market_returns).popitem()[1]
             logger.info("Calculated beta")
-            return beta
+            return float(beta)
         except Exception as e:
             logger.error(f"Error calculating beta: {str(e)}")
             return 0.0
 
+    def _betas(self, returns: pd.DataFrame, market_returns: Optional[pd.Series]) -> Dict[str, float]:
+        """Per-asset betas without error handling; see calculate_betas."""
+        asset_returns = returns.to_numpy(dtype=_DTYPE)
+        if market_returns is None:
+            market = asset_returns.mean(axis=1)
+        else:
+            market = market_returns.reindex(returns.index).to_numpy(dtype=_DTYPE)
+        
+        # beta_i = cov(r_i, m) / var(m), as a single matrix expression
+        market_centered = market - market.mean()
+        market_variance = (market_centered * market_centered).mean()
+        covariances = ((asset_returns - asset_returns.mean(axis=0)) * market_centered[:, None]).mean(axis=0)
+        betas = dict(zip(returns.columns, covariances / market_variance))
+        return betas
+
+    def calculate_betas(
+        self,
+        returns: pd.DataFrame,
+        market_returns: Optional[pd.Series] = None
+    ) -> Dict[str, float]:
+        """
+        Calculate the beta of every asset relative to the market in one pass.
+        
+        Args:
+            returns: DataFrame of asset returns
+            market_returns: Series of market returns aligned with `returns`
+                (if None, the cross-sectional mean of `returns` is used)
+            
+        Returns:
+            Dictionary mapping assets to their beta values
+        """
+        try:
+            betas = self._betas(returns, market_returns)
+            logger.info("Calculated betas")
+            return {asset: float(beta) for asset, beta in betas.items()}
+        except Exception as e:
+            logger.error(f"Error calculating betas: {str(e)}")
+            return {}
+
+    def _stress_test(self, returns: pd.DataFrame, weights: List[float], stress_scenarios: Dict[str, float]) -> Dict:
+        """Stress test results without error handling; see stress_test_portfolio."""
+        impacts = np.fromiter(stress_scenarios.values(), dtype=_DTYPE, count=len(stress_scenarios))
+        
+        # Scaling every asset's returns by (1 + impact) is the same as scaling
+        # the weights, so each column of `scenario_weights` is one stressed
+        # portfolio and a single matrix product covers every scenario
+        scenario_weights = np.asarray(weights, dtype=_DTYPE)[:, None] * (1 + impacts)[None, :]
+        portfolio_returns = self._asset_returns(returns) @ scenario_weights
+        
+        # Calculate stressed portfolio metrics
+        volatility = portfolio_returns.std(axis=0, ddof=1) * np.sqrt(252)
+        var_95 = np.percentile(portfolio_returns, (1 - 0.95) * 100, axis=0)
+        # Peak-to-trough drawdown per scenario; the kernel wants time on the last axis
+        drawdowns = max_drawdown(portfolio_returns.T)
+        
+        results = {
+            scenario: {
+                'volatility': volatility[k],
+                'var_95': var_95[k],
+                'max_drawdown': drawdowns[k]
+            }
+            for k, scenario in enumerate(stress_scenarios)
+        }
+        return results
+
     def stress_test_portfolio(
         self,
         returns: pd.DataFrame,
@@ -199,31 +363,34 @@ class RiskAgent:
             Dictionary containing stress test results
         """
         try:
-            results = {}
-            
-            for scenario, impact in stress_scenarios.items():
-                # Apply stress scenario
-                stressed_returns = returns.copy()
-                for asset in stressed_returns.columns:
-                    stressed_returns[asset] = stressed_returns[asset] * (1 + impact)
-                
-                # Calculate stressed portfolio metrics
-                portfolio_returns = (stressed_returns * weights).sum(axis=1)
-                volatility = portfolio_returns.std() * np.sqrt(252)
-                var_95 = self.calculate_var(portfolio_returns, 0.95)
-                
-                results[scenario] = {
-                    'volatility': volatility,
-                    'var_95': var_95,
-                    'max_drawdown': ((1 + portfolio_returns).cumprod() - 1).min()
-                }
-            
+            results = self._stress_test(returns, weights, stress_scenarios)
             logger.info("Completed portfolio stress testing")
-            return results
+            return {
+                scenario: {metric: float(value) for metric, value in metrics.items()}
+                for scenario, metrics in results.items()
+            }
         except Exception as e:
             logger.error(f"Error in stress testing: {str(e)}")
             return {}
 
+    def _risk_contribution(self, returns: pd.DataFrame, weights: List[float]) -> Dict[str, float]:
+        """Risk contributions without error handling; see calculate_risk_contribution."""
+        asset_returns = self._asset_returns(returns)
+        weights = np.asarray(weights, dtype=_DTYPE)
+        
+        # Calculate portfolio volatility
+        portfolio_returns = asset_returns @ weights
+        portfolio_volatility = portfolio_returns.std(ddof=1) * np.sqrt(252)
+        
+        # Covariance of every asset with the portfolio in one product
+        covariances = (asset_returns - asset_returns.mean(axis=0)).T @ (portfolio_returns - portfolio_returns.mean())
+        covariances /= len(portfolio_returns) - 1
+        
+        # Calculate marginal and percentage contributions
+        marginal_contributions = weights * covariances / portfolio_volatility
+        risk_contributions = dict(zip(returns.columns, marginal_contributions / marginal_contributions.sum()))
+        return risk_contributions
+
     def calculate_risk_contribution(
         self,
         returns: pd.DataFrame,
@@ -240,28 +407,9 @@ class RiskAgent:
             Dictionary mapping assets to their risk contributions
         """
         try:
-            # Calculate portfolio volatility
-            portfolio_returns = (returns * weights).sum(axis=1)
-            portfolio_volatility = portfolio_returns.std() * np.sqrt(252)
-            
-            # Calculate marginal contributions
-            marginal_contributions = {}
-            for asset in returns.columns:
-                # Calculate covariance with portfolio
-                covariance = returns[asset].cov(portfolio_returns)
-                # Calculate marginal contribution
-                marginal_contributions[asset] = (weights[returns.columns.get_loc(asset)] * 
-                                               covariance / portfolio_volatility)
-            
-            # Calculate percentage contributions
-            total_contribution = sum(marginal_contributions.values())
-            risk_contributions = {
-                asset: contribution / total_contribution
-                for asset, contribution in marginal_contributions.items()
-            }
-            
+            risk_contributions = self._risk_contribution(returns, weights)
             logger.info("Calculated risk contributions")
-            return risk_contributions
+            return {asset: float(contribution) for asset, contribution in risk_contributions.items()}
         except Exception as e:
             logger.error(f"Error calculating risk contributions: {str(e)}")
             return {}
@@ -1,37 +1,310 @@
+import hashlib
+import itertools
 import logging
 import pandas as pd
 import numpy as np
+from numba import njit
 from typing import Dict, List, Optional, Tuple
 import os
 from datetime import datetime, timedelta
 
-from src.config.settings import CACHE_DIR, LOG_DIR, INITIAL_CAPITAL, COMMISSION_RATE
+from src.config.settings import CACHE_DIR, INITIAL_CAPITAL, COMMISSION_RATE
 from src.agents.data_aggregation_agent import DataAggregationAgent
+from src.tools.cache import FileCache
+from src.logging_setup import get_logger
 
-# Set up logging
-os.makedirs(LOG_DIR, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(LOG_DIR, 'strategy_agent.log'),
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__, 'strategy_agent.log')
+
+# Price dtypes by precision name. Parameter sweeps default to float32, which
+# halves the memory traffic of the signal tensors; single backtests whose
+# figures get reported default to float64.
+_PRECISION_DTYPES = {
+    'fp32': np.float32,
+    'fp64': np.float64
+}
+
+# Maximum age (in seconds) of a cached optimization result. Results are
+# determined by their cache key, so this only bounds how long results from
+# older strategy code can survive.
+BACKTEST_CACHE_TTL_SECONDS = 7 * 86400
+
+@njit(cache=True, nogil=True)
+def _backtest_signal_nb(
+    close: np.ndarray,
+    signal: np.ndarray,
+    initial_capital: float,
+    commission_rate: float,
+    store_curves: bool = True
+) -> Tuple[float, float, int, int, float, np.ndarray, np.ndarray]:
+    """
+    Single-pass backtest of a per-bar signal over a close price array.
+    
+    Mirrors the pandas formulation: positions trade on the bar after the
+    signal, and the first two bars have no net return because the position
+    change is undefined there.
+    
+    Signals are int8 positions in {-1, 0, 1}; position, trade and return for
+    each bar are computed in registers rather than as intermediate arrays.
+    
+    A bar whose return is undefined because it or the previous close is NaN
+    has no net return, as with pandas' NaN-skipping cumprod and std: equity
+    carries over unchanged, and the bar is left out of the volatility, wins
+    and trades.
+    
+    Returns:
+        Tuple of (volatility of net returns, max drawdown, winning bars,
+        bars with a trade, final equity, equity curve, drawdown curve);
+        values without a net return are NaN, and both curves are empty
+        unless store_curves is set
+    """
+    n = close.shape[0]
+    curve_length = n if store_curves else 0
+    equity_curve = np.full(curve_length, np.nan)
+    drawdown_curve = np.full(curve_length, np.nan)
+    
+    growth = 1.0
+    equity = np.nan
+    peak = -np.inf
+    max_drawdown = np.nan
+    wins = 0
+    trades = 0
+    net_sum = 0.0
+    net_returns = np.empty(max(n - 2, 0))
+    m = 0
+    for i in range(2, n):
+        position = signal[i - 1]
+        trade = abs(position - signal[i - 2])
+        net = position * (close[i] / close[i - 1] - 1.0) - trade * commission_rate
+        if np.isnan(net):
+            continue
+        net_returns[m] = net
+        m += 1
+        net_sum += net
+        
+        growth *= 1.0 + net
+        equity = growth * initial_capital
+        if equity > peak:
+            peak = equity
+        drawdown = (equity - peak) / peak
+        if not drawdown >= max_drawdown:
+            max_drawdown = drawdown
+        if store_curves:
+            equity_curve[i] = equity
+            drawdown_curve[i] = drawdown
+        
+        if net > 0:
+            wins += 1
+        if trade > 0:
+            trades += 1
+    
+    # Sample standard deviation of the net returns (two-pass, like pandas)
+    volatility = np.nan
+    if m > 1:
+        mean = net_sum / m
+        sq_sum = 0.0
+        for j in range(m):
+            sq_sum += (net_returns[j] - mean) ** 2
+        volatility = np.sqrt(sq_sum / (m - 1))
+    
+    return volatility, max_drawdown, wins, trades, equity, equity_curve, drawdown_curve
+
+@njit(cache=True)
+def _backtest_grid_nb(
+    close: np.ndarray,
+    signals: np.ndarray,
+    initial_capital: float,
+    commission_rate: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Backtest every row of a (n_signals, n_bars) signal matrix over the same closes.
+    
+    The loop is serial for the same reason as play_agent's
+    _compute_universe_features: optimization runs on a worker thread, where
+    numba's parallel threading layer keeps the process from exiting.
+    
+    Returns:
+        Tuple of (volatility of net returns, final equity), one entry per row
+    """
+    n_signals = signals.shape[0]
+    volatility = np.empty(n_signals)
+    final_equity = np.empty(n_signals)
+    for k in range(n_signals):
+        result = _backtest_signal_nb(close, signals[k], initial_capital, commission_rate, False)
+        volatility[k] = result[0]
+        final_equity[k] = result[4]
+    return volatility, final_equity
+
+def _rolling_mean_std(values: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rolling mean and sample standard deviation from cumulative sums in O(n).
+    
+    Like pandas' rolling mean and std, a window that contains a NaN gives NaN
+    without affecting any other window. Values are centered on the mean of
+    the valid values before summing, which keeps the running sums small.
+    
+    Args:
+        values: Array of values
+        window: Rolling window length
+        
+    Returns:
+        Tuple of (rolling mean, rolling standard deviation), NaN until a full
+        window is available (the standard deviation is all NaN for a window of 1)
+    """
+    n = len(values)
+    mean = np.full(n, np.nan)
+    std = np.full(n, np.nan)
+    if window < 1 or window > n:
+        return mean, std
+    
+    valid = ~np.isnan(values)
+    offset = values[valid].mean() if valid.any() else 0.0
+    centered = np.where(valid, values - offset, 0.0)
+    cumsum = np.concatenate(([0.0], np.cumsum(centered)))
+    cumsum_sq = np.concatenate(([0.0], np.cumsum(centered * centered)))
+    count = np.concatenate(([0], np.cumsum(valid)))
+    window_sum = cumsum[window:] - cumsum[:-window]
+    window_sum_sq = cumsum_sq[window:] - cumsum_sq[:-window]
+    full = (count[window:] - count[:-window]) == window
+    mean[window - 1:] = np.where(full, window_sum / window + offset, np.nan)
+    
+    if window > 1:
+        squared_deviations = np.maximum(window_sum_sq - window_sum * window_sum / window, 0)
+        std[window - 1:] = np.where(full, np.sqrt(squared_deviations / (window - 1)), np.nan)
+    return mean, std
+
+def _momentum_signals(close: np.ndarray, lookback_periods: np.ndarray) -> np.ndarray:
+    """
+    Momentum signals for several lookback periods at once.
+    
+    Args:
+        close: Array of close prices
+        lookback_periods: Array of lookback periods
+        
+    Returns:
+        int8 array of shape (n_lookbacks, n_bars): long when the lookback
+        return is positive, short otherwise (including before enough history
+        exists)
+    """
+    past = np.arange(len(close)) - lookback_periods[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rising = (past >= 0) & (close / close[np.maximum(past, 0)] - 1 > 0)
+    return np.where(rising, 1, -1).astype(np.int8)
+
+def _bollinger_signals(close: np.ndarray, lookback_periods: np.ndarray, std_devs: np.ndarray) -> np.ndarray:
+    """
+    Bollinger band signals for every (lookback period, band width) pair.
+    
+    Args:
+        close: Array of close prices; the bands are compared in its dtype
+        lookback_periods: Array of lookback periods
+        std_devs: Array of band widths in standard deviations
+        
+    Returns:
+        int8 array of shape (n_lookbacks * n_std_devs, n_bars), lookback-major:
+        long below the lower band, short above the upper band, flat otherwise
+    """
+    # The cumulative-sum formulas need float64 whatever the close dtype
+    values = np.asarray(close, dtype=np.float64)
+    bands = [_rolling_mean_std(values, lookback) for lookback in lookback_periods]
+    ma = np.array([mean for mean, _ in bands], dtype=close.dtype)[:, None, :]
+    std = np.array([sd for _, sd in bands], dtype=close.dtype)[:, None, :]
+    width = std * std_devs.astype(close.dtype)[None, :, None]
+    signal = np.where(close < ma - width, 1, np.where(close > ma + width, -1, 0)).astype(np.int8)
+    return signal.reshape(-1, len(close))
+
+def _validate_backtest_inputs(data: pd.DataFrame, lookback_period: int, commission_rate: float) -> None:
+    """Raise ValueError if a backtest cannot produce meaningful results for these inputs."""
+    if 'Close' not in data.columns:
+        raise ValueError("Price data has no 'Close' column")
+    if lookback_period < 1:
+        raise ValueError(f"Lookback period must be at least 1, got {lookback_period}")
+    if len(data) <= lookback_period + 1:
+        raise ValueError(
+            f"Need more than {lookback_period + 1} bars for a {lookback_period}-bar lookback, got {len(data)}"
+        )
+    if commission_rate < 0:
+        raise ValueError(f"Commission rate must be non-negative, got {commission_rate}")
+
+def _price_dtype(precision: str) -> type:
+    """Map a precision name to the dtype prices are backtested in."""
+    if precision not in _PRECISION_DTYPES:
+        raise ValueError(f"Precision must be one of {list(_PRECISION_DTYPES)}, got {precision!r}")
+    return _PRECISION_DTYPES[precision]
+
+def curves_to_dict(results: Dict, index: pd.Index) -> Dict:
+    """
+    Convert a backtest's equity and drawdown curves to date-keyed dicts.
+    
+    Args:
+        results: Backtest results returned with return_curves=True
+        index: Index of the price data the backtest ran on
+        
+    Returns:
+        Copy of the results with the curves as dicts keyed by `index`
+    """
+    converted = dict(results)
+    for key in ('equity_curve', 'drawdown_curve'):
+        if key in converted:
+            converted[key] = pd.Series(converted[key], index=index).to_dict()
+    return converted
 
 class StrategyAgent:
-    def __init__(self):
-        """Initialize the Strategy Agent."""
-        self.data_agent = DataAggregationAgent()
+    def __init__(self, data_agent: Optional[DataAggregationAgent] = None):
+        """
+        Initialize the Strategy Agent.
+        
+        Args:
+            data_agent: Data aggregation agent to fetch data through; pass a shared
+                one so that agents reuse its caches. A new one is created if omitted.
+        """
+        self.data_agent = data_agent or DataAggregationAgent()
         self.cache_dir = CACHE_DIR
-        os.makedirs(self.cache_dir, exist_ok=True)
+        self.backtest_cache = FileCache(os.path.join(self.cache_dir, 'backtests'), BACKTEST_CACHE_TTL_SECONDS)
         logger.info("Strategy Agent initialized")
 
+    def _backtest_results(
+        self,
+        close: np.ndarray,
+        signal: np.ndarray,
+        initial_capital: float,
+        commission_rate: float,
+        return_curves: bool
+    ) -> Dict:
+        """Run a signal through the backtest kernel and assemble the results dict."""
+        volatility, max_drawdown, winning_trades, total_trades, final_equity, equity, drawdown = _backtest_signal_nb(
+            close, signal, initial_capital, commission_rate, return_curves
+        )
+        
+        # Calculate performance metrics
+        total_return = (final_equity / initial_capital) - 1
+        annual_return = (1 + total_return) ** (252 / len(close)) - 1
+        volatility *= np.sqrt(252)
+        sharpe_ratio = annual_return / volatility if volatility != 0 else 0
+        win_rate = winning_trades / total_trades if total_trades > 0 else 0
+        
+        results = {
+            'total_return': total_return,
+            'annual_return': annual_return,
+            'volatility': volatility,
+            'sharpe_ratio': sharpe_ratio,
+            'max_drawdown': max_drawdown,
+            'win_rate': win_rate,
+            'total_trades': total_trades
+        }
+        if return_curves:
+            results['equity_curve'] = equity
+            results['drawdown_curve'] = drawdown
+        return results
+
     def backtest_momentum_strategy(
         self,
         data: pd.DataFrame,
         lookback_period: int = 20,
         holding_period: int = 5,
         initial_capital: float = INITIAL_CAPITAL,
-        commission_rate: float = COMMISSION_RATE
+        commission_rate: float = COMMISSION_RATE,
+        return_curves: bool = True,
+        precision: str = 'fp64'
     ) -> Dict:
         """
         Backtest a simple momentum strategy.
@@ -42,65 +315,32 @@ class StrategyAgent:
             holding_period: Number of days to hold positions
             initial_capital: Initial capital for backtesting
             commission_rate: Commission rate per trade
+            return_curves: Whether to include the equity and drawdown curves,
+                as arrays aligned with `data`'s rows
+            precision: 'fp64' or 'fp32', the precision prices are backtested in
             
         Returns:
             Dictionary containing backtest results
-        """
-        try:
-            # Calculate returns and momentum
-            data['Returns'] = data['Close'].pct_change()
-            data['Momentum'] = data['Close'].pct_change(periods=lookback_period)
-            
-            # Generate signals
-            data['Signal'] = np.where(data['Momentum'] > 0, 1, -1)
             
-            # Calculate positions
-            data['Position'] = data['Signal'].shift(1)
-            
-            # Calculate strategy returns
-            data['Strategy_Returns'] = data['Position'] * data['Returns']
-            
-            # Calculate commission costs
-            data['Trades'] = data['Position'].diff().abs()
-            data['Commission'] = data['Trades'] * commission_rate
-            
-            # Calculate equity curve
-            data['Strategy_Returns_Net'] = data['Strategy_Returns'] - data['Commission']
-            data['Equity'] = (1 + data['Strategy_Returns_Net']).cumprod() * initial_capital
-            
-            # Calculate performance metrics
-            total_return = (data['Equity'].iloc[-1] / initial_capital) - 1
-            annual_return = (1 + total_return) ** (252 / len(data)) - 1
-            volatility = data['Strategy_Returns_Net'].std() * np.sqrt(252)
-            sharpe_ratio = annual_return / volatility if volatility != 0 else 0
-            
-            # Calculate drawdown
-            data['Peak'] = data['Equity'].cummax()
-            data['Drawdown'] = (data['Equity'] - data['Peak']) / data['Peak']
-            max_drawdown = data['Drawdown'].min()
-            
-            # Calculate win rate
-            winning_trades = (data['Strategy_Returns_Net'] > 0).sum()
-            total_trades = (data['Trades'] > 0).sum()
-            win_rate = winning_trades / total_trades if total_trades > 0 else 0
-            
-            results = {
-                'total_return': total_return,
-                'annual_return': annual_return,
-                'volatility': volatility,
-                'sharpe_ratio': sharpe_ratio,
-                'max_drawdown': max_drawdown,
-                'win_rate': win_rate,
-                'total_trades': total_trades,
-                'equity_curve': data['Equity'].to_dict(),
-                'drawdown_curve': data['Drawdown'].to_dict()
-            }
-            
-            logger.info("Completed momentum strategy backtest")
-            return results
-        except Exception as e:
-            logger.error(f"Error in momentum strategy backtest: {str(e)}")
-            return {}
+        Raises:
+            ValueError: If the data or parameters cannot be backtested
+        """
+        _validate_backtest_inputs(data, lookback_period, commission_rate)
+        close = data['Close'].to_numpy(dtype=_price_dtype(precision))
+        
+        # Long when the lookback return is positive, short otherwise
+        # (including before enough history exists)
+        signal = _momentum_signals(close, np.array([lookback_period]))[0]
+        
+        results = self._backtest_results(close, signal, initial_capital, commission_rate, return_curves)
+        
+        # Backtests can be run many times in a row, so keep per-run records at debug level
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"Completed momentum strategy backtest (lookback={lookback_period}, "
+                f"sharpe={results['sharpe_ratio']:.3f})"
+            )
+        return results
 
     def backtest_mean_reversion_strategy(
         self,
@@ -108,7 +348,9 @@ class StrategyAgent:
         lookback_period: int = 20,
         std_devs: float = 2.0,
         initial_capital: float = INITIAL_CAPITAL,
-        commission_rate: float = COMMISSION_RATE
+        commission_rate: float = COMMISSION_RATE,
+        return_curves: bool = True,
+        precision: str = 'fp64'
     ) -> Dict:
         """
         Backtest a mean reversion strategy using Bollinger Bands.
@@ -119,77 +361,51 @@ class StrategyAgent:
             std_devs: Number of standard deviations for bands
             initial_capital: Initial capital for backtesting
             commission_rate: Commission rate per trade
+            return_curves: Whether to include the equity and drawdown curves,
+                as arrays aligned with `data`'s rows
+            precision: 'fp64' or 'fp32', the precision prices are backtested in
             
         Returns:
             Dictionary containing backtest results
-        """
-        try:
-            # Calculate Bollinger Bands
-            data['MA'] = data['Close'].rolling(window=lookback_period).mean()
-            data['STD'] = data['Close'].rolling(window=lookback_period).std()
-            data['Upper_Band'] = data['MA'] + (data['STD'] * std_devs)
-            data['Lower_Band'] = data['MA'] - (data['STD'] * std_devs)
             
-            # Generate signals
-            data['Signal'] = np.where(
-                data['Close'] < data['Lower_Band'], 1,
-                np.where(data['Close'] > data['Upper_Band'], -1, 0)
+        Raises:
+            ValueError: If the data or parameters cannot be backtested
+        """
+        _validate_backtest_inputs(data, lookback_period, commission_rate)
+        close = data['Close'].to_numpy(dtype=_price_dtype(precision))
+        
+        # Long below the lower Bollinger Band, short above the upper one
+        signal = _bollinger_signals(close, np.array([lookback_period]), np.array([std_devs]))[0]
+        
+        results = self._backtest_results(close, signal, initial_capital, commission_rate, return_curves)
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"Completed mean reversion strategy backtest (lookback={lookback_period}, "
+                f"std_devs={std_devs}, sharpe={results['sharpe_ratio']:.3f})"
             )
-            
-            # Calculate positions
-            data['Position'] = data['Signal'].shift(1)
-            
-            # Calculate strategy returns
-            data['Returns'] = data['Close'].pct_change()
-            data['Strategy_Returns'] = data['Position'] * data['Returns']
-            
-            # Calculate commission costs
-            data['Trades'] = data['Position'].diff().abs()
-            data['Commission'] = data['Trades'] * commission_rate
-            
-            # Calculate equity curve
-            data['Strategy_Returns_Net'] = data['Strategy_Returns'] - data['Commission']
-            data['Equity'] = (1 + data['Strategy_Returns_Net']).cumprod() * initial_capital
-            
-            # Calculate performance metrics
-            total_return = (data['Equity'].iloc[-1] / initial_capital) - 1
-            annual_return = (1 + total_return) ** (252 / len(data)) - 1
-            volatility = data['Strategy_Returns_Net'].std() * np.sqrt(252)
-            sharpe_ratio = annual_return / volatility if volatility != 0 else 0
-            
-            # Calculate drawdown
-            data['Peak'] = data['Equity'].cummax()
-            data['Drawdown'] = (data['Equity'] - data['Peak']) / data['Peak']
-            max_drawdown = data['Drawdown'].min()
-            
-            # Calculate win rate
-            winning_trades = (data['Strategy_Returns_Net'] > 0).sum()
-            total_trades = (data['Trades'] > 0).sum()
-            win_rate = winning_trades / total_trades if total_trades > 0 else 0
-            
-            results = {
-                'total_return': total_return,
-                'annual_return': annual_return,
-                'volatility': volatility,
-                'sharpe_ratio': sharpe_ratio,
-                'max_drawdown': max_drawdown,
-                'win_rate': win_rate,
-                'total_trades': total_trades,
-                'equity_curve': data['Equity'].to_dict(),
-                'drawdown_curve': data['Drawdown'].to_dict()
-            }
-            
-            logger.info("Completed mean reversion strategy backtest")
-            return results
-        except Exception as e:
-            logger.error(f"Error in mean reversion strategy backtest: {str(e)}")
-            return {}
+        return results
+
+    def _optimization_cache_key(self, close: np.ndarray, strategy_type: str, param_ranges: Dict) -> str:
+        """Build a cache key covering everything a grid search result depends on."""
+        settings = (
+            strategy_type,
+            close.dtype.str,
+            sorted((name, [float(value) for value in values]) for name, values in param_ranges.items()),
+            INITIAL_CAPITAL,
+            COMMISSION_RATE
+        )
+        digest = hashlib.blake2b(close.tobytes(), digest_size=16)
+        digest.update(repr(settings).encode())
+        return f"optimize_{digest.hexdigest()}"
 
     def optimize_strategy_parameters(
         self,
         data: pd.DataFrame,
         strategy_type: str = 'momentum',
-        param_ranges: Dict = None
+        param_ranges: Dict = None,
+        precision: str = 'fp32',
+        force_refresh: bool = False
     ) -> Dict:
         """
         Optimize strategy parameters using grid search.
@@ -198,75 +414,103 @@ class StrategyAgent:
             data: DataFrame containing price data
             strategy_type: Type of strategy to optimize ('momentum' or 'mean_reversion')
             param_ranges: Dictionary of parameter ranges to test
+            precision: 'fp32' or 'fp64', the precision prices are backtested in
+            force_refresh: Whether to rerun the grid instead of using a cached result
+                for the same prices, strategy and parameter ranges
             
         Returns:
             Dictionary containing optimization results
-        """
-        try:
-            if param_ranges is None:
-                if strategy_type == 'momentum':
-                    param_ranges = {
-                        'lookback_period': range(10, 51, 10),
-                        'holding_period': range(1, 11, 2)
-                    }
-                else:  # mean_reversion
-                    param_ranges = {
-                        'lookback_period': range(10, 51, 10),
-                        'std_devs': [1.5, 2.0, 2.5]
-                    }
-            
-            best_sharpe = -float('inf')
-            best_params = {}
-            results = []
             
+        Raises:
+            ValueError: If the data cannot be backtested with one of the lookback periods
+        """
+        if param_ranges is None:
             if strategy_type == 'momentum':
-                for lookback in param_ranges['lookback_period']:
-                    for holding in param_ranges['holding_period']:
-                        result = self.backtest_momentum_strategy(
-                            data.copy(),
-                            lookback_period=lookback,
-                            holding_period=holding
-                        )
-                        if result and result['sharpe_ratio'] > best_sharpe:
-                            best_sharpe = result['sharpe_ratio']
-                            best_params = {
-                                'lookback_period': lookback,
-                                'holding_period': holding
-                            }
-                        results.append({
-                            'params': {'lookback': lookback, 'holding': holding},
-                            'sharpe_ratio': result.get('sharpe_ratio', 0)
-                        })
+                param_ranges = {
+                    'lookback_period': range(10, 51, 10),
+                    'holding_period': range(1, 11, 2)
+                }
             else:  # mean_reversion
-                for lookback in param_ranges['lookback_period']:
-                    for std_dev in param_ranges['std_devs']:
-                        result = self.backtest_mean_reversion_strategy(
-                            data.copy(),
-                            lookback_period=lookback,
-                            std_devs=std_dev
-                        )
-                        if result and result['sharpe_ratio'] > best_sharpe:
-                            best_sharpe = result['sharpe_ratio']
-                            best_params = {
-                                'lookback_period': lookback,
-                                'std_devs': std_dev
-                            }
-                        results.append({
-                            'params': {'lookback': lookback, 'std_devs': std_dev},
-                            'sharpe_ratio': result.get('sharpe_ratio', 0)
-                        })
-            
-            optimization_results = {
-                'best_params': best_params,
-                'best_sharpe_ratio': best_sharpe,
-                'all_results': results
-            }
-            
-            logger.info(f"Completed {strategy_type} strategy optimization")
-            return optimization_results
-        except Exception as e:
-            logger.error(f"Error in strategy optimization: {str(e)}")
-            return {}
+                param_ranges = {
+                    'lookback_period': range(10, 51, 10),
+                    'std_devs': [1.5, 2.0, 2.5]
+                }
+        
+        # Check every lookback up front so that no grid point silently fails
+        for lookback in param_ranges['lookback_period']:
+            _validate_backtest_inputs(data, lookback, COMMISSION_RATE)
+        close = data['Close'].to_numpy(dtype=_price_dtype(precision))
+        
+        cache_key = self._optimization_cache_key(close, strategy_type, param_ranges)
+        if not force_refresh:
+            cached = self.backtest_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Loaded cached {strategy_type} strategy optimization")
+                return cached
+        
+        # Every combination runs on the same closes, so build all of their
+        # signals as one (n_combinations, n_bars) matrix and backtest the
+        # rows in a single kernel call
+        if strategy_type == 'momentum':
+            param_grid = list(itertools.product(param_ranges['lookback_period'], param_ranges['holding_period']))
+            # The holding period does not change the signal, so only
+            # distinct lookbacks need a backtest
+            lookbacks, combo_rows = np.unique(
+                np.array([lookback for lookback, _ in param_grid], dtype=np.int64), return_inverse=True
+            )
+            signals = _momentum_signals(close, lookbacks)
+            grid_params = [
+                ({'lookback_period': int(lookback), 'holding_period': int(holding)},
+                 {'lookback': int(lookback), 'holding': int(holding)})
+                for lookback, holding in param_grid
+            ]
+        else:  # mean_reversion
+            lookbacks = np.array(list(param_ranges['lookback_period']), dtype=np.int64)
+            std_devs = np.array(list(param_ranges['std_devs']), dtype=np.float64)
+            signals = _bollinger_signals(close, lookbacks, std_devs)
+            combo_rows = np.arange(len(signals))
+            grid_params = [
+                ({'lookback_period': int(lookback), 'std_devs': float(std_dev)},
+                 {'lookback': int(lookback), 'std_devs': float(std_dev)})
+                for lookback, std_dev in itertools.product(param_ranges['lookback_period'], param_ranges['std_devs'])
+            ]
+        
+        initial_capital, commission_rate = INITIAL_CAPITAL, COMMISSION_RATE
+        volatility, final_equity = _backtest_grid_nb(close, signals, initial_capital, commission_rate)
+        
+        # Same metrics as _backtest_results, for every row at once
+        with np.errstate(invalid='ignore', divide='ignore'):
+            annual_return = (final_equity / initial_capital) ** (252 / len(close)) - 1
+            volatility = volatility * np.sqrt(252)
+            sharpe = np.where(volatility != 0, annual_return / volatility, 0.0)[combo_rows]
+        
+        results = [
+            {'params': params, 'sharpe_ratio': float(sharpe_ratio)}
+            for (_, params), sharpe_ratio in zip(grid_params, sharpe)
+        ]
+        
+        # First combination with the highest Sharpe ratio; NaN ratios never win
+        best_sharpe = -float('inf')
+        best_params = {}
+        if len(sharpe):
+            ranked = np.where(np.isnan(sharpe), -np.inf, sharpe)
+            best = int(np.argmax(ranked))
+            if ranked[best] > best_sharpe:
+                best_sharpe = float(sharpe[best])
+                best_params = grid_params[best][0]
+        
+        optimization_results = {
+            'best_params': best_params,
+            'best_sharpe_ratio': best_sharpe,
+            'all_results': results
+        }
+        self.backtest_cache.set(cache_key, optimization_results)
+        
+        logger.info(
+            f"Completed {strategy_type} strategy optimization over {len(results)} parameter sets, "
+            f"best {best_params} with Sharpe ratio {best_sharpe:.3f}"
+        )
+        return optimization_results
 
 if __name__ == "__main__":
     # Example usage
@@ -276,14 +520,14 @@ if __name__ == "__main__":
     data = agent.data_agent.fetch_stock_data("AAPL")
     
     # Backtest momentum strategy
-    momentum_results = agent.backtest_momentum_strategy(data.copy())
+    momentum_results = agent.backtest_momentum_strategy(data)
     print("\nMomentum Strategy Results:")
     print(f"Total Return: {momentum_results['total_return']:.2%}")
     print(f"Sharpe Ratio: {momentum_results['sharpe_ratio']:.2f}")
     print(f"Max Drawdown: {momentum_results['max_drawdown']:.2%}")
     
     # Backtest mean reversion strategy
-    mean_reversion_results = agent.backtest_mean_reversion_strategy(data.copy())
+    mean_reversion_results = agent.backtest_mean_reversion_strategy(data)
     print("\nMean Reversion Strategy Results:")
     print(f"Total Return: {mean_reversion_results['total_return']:.2%}")
     print(f"Sharpe Ratio: {mean_reversion_results['sharpe_ratio']:.2f}")
@@ -291,7 +535,7 @@ if __name__ == "__main__":
     
     # Optimize momentum strategy
     momentum_optimization = agent.optimize_strategy_parameters(
-        data.copy(),
+        data,
         strategy_type='momentum'
     )
     print("\nMomentum Strategy Optimization:")
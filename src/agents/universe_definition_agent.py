@@ -1,30 +1,153 @@
-import logging
+import asyncio
+import re
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Optional, Any
-import os
+from typing import List, Dict, Optional, Any, AsyncIterator, Callable, Tuple
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from src.config.settings import CACHE_DIR, LOG_DIR
-from src.agents.data_aggregation_agent import DataAggregationAgent
+from src.config.settings import CACHE_DIR
+from src.agents.data_aggregation_agent import DataAggregationAgent, INFO_CACHE_TTL_SECONDS
 from src.llm.base_llm_client import BaseLLMClient
+from src.logging_setup import get_logger
 
-# Set up logging
-os.makedirs(LOG_DIR, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(LOG_DIR, 'universe_definition_agent.log'),
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__, 'universe_definition_agent.log')
+
+# Maximum number of universe definition requests in flight at once, to stay
+# within the provider's rate limits
+LLM_CONCURRENCY_LIMIT = 8
+
+# Numbered section headings ("1. ", "2. ", ...) at the start of a line
+_SECTION_PATTERN = re.compile(r'^\s*([1-5])\.\s+', re.MULTILINE)
+_DEFINITION_SECTIONS = {
+    "1": "criteria",
+    "2": "rationale",
+    "3": "characteristics",
+    "4": "risk_considerations",
+    "5": "monitoring"
+}
+
+# Universe definition prompt. LLM responses are cached by the full prompt, so
+# any edit to this text invalidates previously cached definitions.
+_UNIVERSE_PROMPT_TEMPLATE = """
+        Define a universe of stocks based on the following data:
+        
+        Stock Metrics:
+        {metrics}
+        
+        Please provide:
+        1. Universe criteria and filters
+        2. Rationale for inclusion/exclusion
+        3. Expected universe characteristics
+        4. Risk considerations
+        5. Monitoring parameters
+        """
+
+def _stack_right_aligned(columns: List[np.ndarray], length: int) -> np.ndarray:
+    """Stack 1-D arrays as columns, aligned on their last element and NaN-padded at the top."""
+    stacked = np.full((length, len(columns)), np.nan)
+    for j, column in enumerate(columns):
+        stacked[length - len(column):, j] = column
+    return stacked
 
 class UniverseDefinitionAgent:
-    def __init__(self):
-        """Initialize the universe definition agent with LLM client."""
-        self.data_agent = DataAggregationAgent()
+    def __init__(self, data_agent: Optional[DataAggregationAgent] = None):
+        """
+        Initialize the universe definition agent with LLM client.
+        
+        Args:
+            data_agent: Data aggregation agent to fetch data through; pass a shared
+                one so that agents reuse its caches. A new one is created if omitted.
+        """
+        self.data_agent = data_agent or DataAggregationAgent()
         self.cache_dir = CACHE_DIR
-        os.makedirs(self.cache_dir, exist_ok=True)
         self.llm_client = BaseLLMClient("universe_agent")
+        # Info and price history per ticker, shared by the universe builders so
+        # that overlapping ticker lists are only looked up once
+        self._info_cache: Dict[str, Tuple[float, Dict]] = {}
+        self._data_cache: Dict[str, Tuple[float, pd.DataFrame]] = {}
         logger.info("Universe definition agent initialized with LLM client")
 
+    def _cached(self, cache: Dict[str, Tuple[float, Any]], ticker: str) -> Optional[Any]:
+        """Return a ticker's cached lookup, or None if it is missing or stale."""
+        entry = cache.get(ticker)
+        if entry is not None and time.monotonic() - entry[0] < INFO_CACHE_TTL_SECONDS:
+            return entry[1]
+        return None
+
+    def _memoized(self, cache: Dict[str, Tuple[float, Any]], ticker: str, fetch: Callable[[str], Any]) -> Any:
+        """Return a cached lookup for a ticker, refetching it once it is stale or was empty."""
+        value = self._cached(cache, ticker)
+        if value is not None:
+            return value
+        
+        value = fetch(ticker)
+        if len(value):
+            cache[ticker] = (time.monotonic(), value)
+        return value
+
+    def _get_stock_info(self, ticker: str) -> Dict:
+        """Get stock info through the agent's in-memory cache."""
+        return self._memoized(self._info_cache, ticker, self.data_agent.get_stock_info)
+
+    def _fetch_stock_data(self, ticker: str) -> pd.DataFrame:
+        """Fetch price history through the agent's in-memory cache."""
+        # Hand out a shallow copy so callers adding columns leave the cached frame intact
+        return self._memoized(self._data_cache, ticker, self.data_agent.fetch_stock_data).copy(deep=False)
+
+    def _fetch_multiple_stocks(self, tickers: List[str]) -> Dict[str, pd.DataFrame]:
+        """
+        Fetch price history for several tickers through the agent's in-memory cache.
+        
+        Tickers already fetched by any universe builder are reused; the rest are
+        downloaded together.
+        
+        Args:
+            tickers: List of stock ticker symbols
+            
+        Returns:
+            Dictionary mapping tickers with data to shallow copies of their frames
+        """
+        frames = {ticker: self._cached(self._data_cache, ticker) for ticker in tickers}
+        missing = [ticker for ticker, data in frames.items() if data is None]
+        if missing:
+            fetched = self.data_agent.fetch_multiple_stocks(missing)
+            for ticker, data in fetched.items():
+                self._data_cache[ticker] = (time.monotonic(), data)
+            frames.update({ticker: fetched.get(ticker) for ticker in missing})
+        return {
+            ticker: data.copy(deep=False)
+            for ticker, data in frames.items()
+            if data is not None
+        }
+
+    def _screen_universe(self, tickers: List[str], passes: Callable[[Dict], bool]) -> Dict[str, pd.DataFrame]:
+        """
+        Select the tickers whose info passes a screen and fetch their price history.
+        
+        Info and history lookups are bound by network round-trips, so each phase
+        runs them concurrently rather than ticker by ticker.
+        
+        Args:
+            tickers: List of stock tickers to consider
+            passes: Predicate applied to each ticker's info
+            
+        Returns:
+            Dictionary mapping selected tickers to their data, in input order
+        """
+        if not tickers:
+            return {}
+        
+        with ThreadPoolExecutor(max_workers=min(16, len(tickers))) as executor:
+            infos = list(executor.map(self._get_stock_info, tickers))
+            selected = [ticker for ticker, info in zip(tickers, infos) if info and passes(info)]
+            frames = executor.map(self._fetch_stock_data, selected)
+            return {
+                ticker: data
+                for ticker, data in zip(selected, frames)
+                if not data.empty
+            }
+
     def update_llm_config(self, new_config: Dict[str, Any]) -> None:
         """Update the LLM configuration for the universe definition agent."""
         self.llm_client.update_config(new_config)
@@ -49,67 +172,119 @@ class UniverseDefinitionAgent:
             logger.error(f"Error defining universe: {str(e)}")
             raise
 
-    def _prepare_universe_prompt(self, stock_data: Dict[str, pd.DataFrame]) -> str:
-        """Prepare the universe definition prompt with stock data."""
-        # Extract key metrics from the stock data
-        metrics = self._extract_stock_metrics(stock_data)
+    async def define_universe_stream(self, stock_data: Dict[str, pd.DataFrame]) -> AsyncIterator[Tuple[str, str]]:
+        """
+        Define a universe, yielding each section as soon as it is complete.
         
-        prompt = f"""
-        Define a universe of stocks based on the following data:
+        A section is complete once the next numbered heading arrives, so early
+        sections can be used while later ones are still being generated.
         
-        Stock Metrics:
-        {metrics}
+        Args:
+            stock_data: Dictionary mapping tickers to their price data
+            
+        Yields:
+            (section name, section text) pairs; joining the texts of each
+            section gives the same result as define_universe
+        """
+        try:
+            prompt = self._prepare_universe_prompt(stock_data)
+            
+            text = ""
+            section = None
+            body_start = 0
+            async for chunk in self.llm_client.generate_stream(prompt):
+                text += chunk
+                # Headings are matched on the same line-anchored pattern as the
+                # full parse; a match cannot be undone by text that arrives later
+                for heading in _SECTION_PATTERN.finditer(text, body_start):
+                    if section is not None:
+                        yield section, text[body_start:heading.start()].strip() + "\n"
+                    section = _DEFINITION_SECTIONS[heading.group(1)]
+                    body_start = heading.end()
+            
+            if section is not None:
+                yield section, text[body_start:].strip() + "\n"
+            
+            logger.info("Successfully streamed universe definition")
+            
+        except Exception as e:
+            logger.error(f"Error streaming universe definition: {str(e)}")
+            raise
+
+    async def define_universes_batch(
+        self,
+        datasets: List[Dict[str, pd.DataFrame]],
+        concurrency_limit: int = LLM_CONCURRENCY_LIMIT
+    ) -> List[Dict[str, Any]]:
+        """
+        Define several universes with concurrent LLM requests.
         
-        Please provide:
-        1. Universe criteria and filters
-        2. Rationale for inclusion/exclusion
-        3. Expected universe characteristics
-        4. Risk considerations
-        5. Monitoring parameters
+        Args:
+            datasets: Stock data for each universe to define
+            concurrency_limit: Maximum number of requests in flight at once
+            
+        Returns:
+            Structured definitions, in the same order as `datasets`
         """
+        try:
+            prompts = [self._prepare_universe_prompt(stock_data) for stock_data in datasets]
+            semaphore = asyncio.Semaphore(concurrency_limit)
+            
+            async def generate(prompt: str) -> str:
+                async with semaphore:
+                    return await self.llm_client.generate(prompt)
+            
+            definitions = await asyncio.gather(*(generate(prompt) for prompt in prompts))
+            structured_definitions = [self._parse_universe_definition(definition) for definition in definitions]
+            
+            logger.info(f"Successfully defined {len(structured_definitions)} universes")
+            return structured_definitions
+            
+        except Exception as e:
+            logger.error(f"Error defining universes: {str(e)}")
+            raise
+
+    def _prepare_universe_prompt(self, stock_data: Dict[str, pd.DataFrame]) -> str:
+        """Prepare the universe definition prompt with stock data."""
+        # Extract key metrics from the stock data
+        metrics = self._extract_stock_metrics(stock_data)
         
-        return prompt
+        return _UNIVERSE_PROMPT_TEMPLATE.format(metrics=metrics)
 
     def _extract_stock_metrics(self, stock_data: Dict[str, pd.DataFrame]) -> str:
         """Extract key metrics from the stock data."""
-        metrics = []
-        for ticker, data in stock_data.items():
-            metrics.append(f"\n{ticker}:")
-            metrics.append(f"  - Current Price: {data['Close'].iloc[-1]:.2f}")
-            metrics.append(f"  - Market Cap: {data.get('MarketCap', 'N/A')}")
-            metrics.append(f"  - P/E Ratio: {data.get('PE_Ratio', 'N/A')}")
-            metrics.append(f"  - Volume: {data['Volume'].mean():.2f}")
+        # Read the raw arrays directly rather than going through .iloc and
+        # Series.mean for every ticker
+        closes = np.fromiter(
+            (data['Close'].to_numpy(dtype=np.float64)[-1] for data in stock_data.values()),
+            dtype=np.float64, count=len(stock_data)
+        )
+        volumes = [data['Volume'].to_numpy(dtype=np.float64) for data in stock_data.values()]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_volumes = np.fromiter(
+                (np.nansum(volume) / np.count_nonzero(~np.isnan(volume)) for volume in volumes),
+                dtype=np.float64, count=len(volumes)
+            )
+        
+        metrics = [
+            f"\n{ticker}:\n"
+            f"  - Current Price: {close:.2f}\n"
+            f"  - Market Cap: {data.get('MarketCap', 'N/A')}\n"
+            f"  - P/E Ratio: {data.get('PE_Ratio', 'N/A')}\n"
+            f"  - Volume: {volume:.2f}"
+            for (ticker, data), close, volume in zip(stock_data.items(), closes, mean_volumes)
+        ]
         
         return "\n".join(metrics)
 
     def _parse_universe_definition(self, definition: str) -> Dict[str, Any]:
         """Parse the LLM-generated universe definition into a structured format."""
-        sections = {
-            "criteria": "",
-            "rationale": "",
-            "characteristics": "",
-            "risk_considerations": "",
-            "monitoring": ""
-        }
+        sections = {name: "" for name in _DEFINITION_SECTIONS.values()}
         
-        current_section = None
-        for line in definition.split("\n"):
-            line = line.strip()
-            if not line:
-                continue
-                
-            if "1." in line:
-                current_section = "criteria"
-            elif "2." in line:
-                current_section = "rationale"
-            elif "3." in line:
-                current_section = "characteristics"
-            elif "4." in line:
-                current_section = "risk_considerations"
-            elif "5." in line:
-                current_section = "monitoring"
-            elif current_section:
-                sections[current_section] += line + "\n"
+        # split() yields [preamble, number, body, number, body, ...]
+        parts = _SECTION_PATTERN.split(definition)
+        for number, body in zip(parts[1::2], parts[2::2]):
+            sections[_DEFINITION_SECTIONS[number]] += body.strip() + "\n"
         
         return sections
 
@@ -141,13 +316,17 @@ class UniverseDefinitionAgent:
             if missing_columns:
                 raise ValueError(f"Missing required columns: {missing_columns}")
 
-            # Apply filters
-            filtered = stock_data[
-                (stock_data['Volume'] >= min_volume) &
-                (stock_data['PE_Ratio'] <= max_pe) &
-                (stock_data['Close'] >= min_price) &
-                (stock_data['Close'] <= max_price)
-            ]
+            # Apply filters on the raw column arrays, reading Close only once
+            volume = stock_data['Volume'].to_numpy(dtype=np.float64)
+            pe = stock_data['PE_Ratio'].to_numpy(dtype=np.float64)
+            close = stock_data['Close'].to_numpy(dtype=np.float64)
+            mask = (
+                (volume >= min_volume) &
+                (pe <= max_pe) &
+                (close >= min_price) &
+                (close <= max_price)
+            )
+            filtered = stock_data[mask]
             
             logger.info(f"Filtered stocks: {len(filtered)} out of {len(stock_data)}")
             return filtered
@@ -172,31 +351,47 @@ class UniverseDefinitionAgent:
             lookback_period: Number of days to look back for momentum calculation
             
         Returns:
-            Dictionary mapping tickers to their data
+            Dictionary mapping tickers that currently meet the criteria to
+            their full price history
         """
         try:
             # Fetch data for all tickers
-            stock_data = self.data_agent.fetch_multiple_stocks(tickers)
+            stock_data = self._fetch_multiple_stocks(tickers)
+            stock_data = {
+                ticker: data
+                for ticker, data in stock_data.items()
+                if len(data) > lookback_period
+            }
+            if not stock_data:
+                logger.info("Created momentum universe with 0 stocks")
+                return {}
             
-            momentum_universe = {}
-            for ticker, data in stock_data.items():
-                if len(data) < lookback_period:
-                    continue
-                    
-                # Calculate momentum metrics
-                data['Returns'] = data['Close'].pct_change()
-                data['Momentum'] = data['Close'].pct_change(periods=lookback_period)
-                data['Volume_MA'] = data['Volume'].rolling(window=lookback_period).mean()
-                
-                # Filter based on criteria
-                filtered = data[
-                    (data['Volume_MA'] >= min_volume) &
-                    (data['Close'] >= min_price) &
-                    (data['Momentum'] > 0)  # Positive momentum
-                ]
-                
-                if not filtered.empty:
-                    momentum_universe[ticker] = filtered
+            # Only the latest bar decides inclusion, so stack just the trailing
+            # lookback_period + 1 bars of every ticker and compute the latest
+            # momentum and average volume for the whole universe at once
+            window = lookback_period + 1
+            close = _stack_right_aligned(
+                [data['Close'].to_numpy(dtype=np.float64)[-window:] for data in stock_data.values()], window
+            )
+            volume = _stack_right_aligned(
+                [data['Volume'].to_numpy(dtype=np.float64)[-window:] for data in stock_data.values()], window
+            )
+            with np.errstate(invalid='ignore', divide='ignore'):
+                momentum = close[-1] / close[0] - 1
+            volume_ma = volume[1:].mean(axis=0)
+            
+            # Filter based on criteria
+            keep = (
+                (volume_ma >= min_volume) &
+                (close[-1] >= min_price) &
+                (momentum > 0)  # Positive momentum
+            )
+            
+            momentum_universe = {
+                ticker: data
+                for (ticker, data), selected in zip(stock_data.items(), keep)
+                if selected
+            }
             
             logger.info(f"Created momentum universe with {len(momentum_universe)} stocks")
             return momentum_universe
@@ -224,29 +419,20 @@ class UniverseDefinitionAgent:
             Dictionary mapping tickers to their data
         """
         try:
-            value_universe = {}
-            for ticker in tickers:
-                # Get stock info
-                info = self.data_agent.get_stock_info(ticker)
-                
-                if not info:
-                    continue
-                
+            def passes(info: Dict) -> bool:
                 # Check if required metrics are available
-                if all(metric in info for metric in ['trailingPE', 'priceToBook', 'dividendYield']):
-                    pe = info.get('trailingPE', float('inf'))
-                    pb = info.get('priceToBook', float('inf'))
-                    div_yield = info.get('dividendYield', 0)
-                    
-                    # Apply value criteria
-                    if (pe <= max_pe and 
+                if not all(metric in info for metric in ['trailingPE', 'priceToBook', 'dividendYield']):
+                    return False
+                pe = info.get('trailingPE', float('inf'))
+                pb = info.get('priceToBook', float('inf'))
+                div_yield = info.get('dividendYield', 0)
+                
+                # Apply value criteria
+                return (pe <= max_pe and 
                         pb <= max_pb and 
-                        div_yield >= min_dividend_yield):
-                        
-                        # Get historical data
-                        data = self.data_agent.fetch_stock_data(ticker)
-                        if not data.empty:
-                            value_universe[ticker] = data
+                        div_yield >= min_dividend_yield)
+            
+            value_universe = self._screen_universe(tickers, passes)
             
             logger.info(f"Created value universe with {len(value_universe)} stocks")
             return value_universe
@@ -272,27 +458,18 @@ class UniverseDefinitionAgent:
             Dictionary mapping tickers to their data
         """
         try:
-            growth_universe = {}
-            for ticker in tickers:
-                # Get stock info
-                info = self.data_agent.get_stock_info(ticker)
-                
-                if not info:
-                    continue
-                
+            def passes(info: Dict) -> bool:
                 # Check if required metrics are available
-                if all(metric in info for metric in ['revenueGrowth', 'earningsGrowth']):
-                    revenue_growth = info.get('revenueGrowth', 0)
-                    earnings_growth = info.get('earningsGrowth', 0)
-                    
-                    # Apply growth criteria
-                    if (revenue_growth >= min_revenue_growth and 
-                        earnings_growth >= min_earnings_growth):
-                        
-                        # Get historical data
-                        data = self.data_agent.fetch_stock_data(ticker)
-                        if not data.empty:
-                            growth_universe[ticker] = data
+                if not all(metric in info for metric in ['revenueGrowth', 'earningsGrowth']):
+                    return False
+                revenue_growth = info.get('revenueGrowth', 0)
+                earnings_growth = info.get('earningsGrowth', 0)
+                
+                # Apply growth criteria
+                return (revenue_growth >= min_revenue_growth and 
+                        earnings_growth >= min_earnings_growth)
+            
+            growth_universe = self._screen_universe(tickers, passes)
             
             logger.info(f"Created growth universe with {len(growth_universe)} stocks")
             return growth_universe
@@ -33,6 +33,11 @@ DEFAULT_MODEL_PROVIDER = os.getenv('DEFAULT_MODEL_PROVIDER', 'openai')
 DEFAULT_MODEL = os.getenv('DEFAULT_MODEL', 'gpt-3.5-turbo')
 DEFAULT_TEMPERATURE = float(os.getenv('DEFAULT_TEMPERATURE', '0.7'))
 DEFAULT_MAX_TOKENS = int(os.getenv('DEFAULT_MAX_TOKENS', '2000'))
+# Highest temperature at which LLM responses are cached and reused; an agent's
+# config can override it with a 'cache_max_temperature' entry. The default
+# covers the universe, strategy and risk agents but not the research and play
+# agents, whose reports are meant to vary between runs.
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv('LLM_CACHE_MAX_TEMPERATURE', '0.5'))
 
 # Agent-specific LLM Settings
 AGENT_SETTINGS: Dict[str, Dict[str, Any]] = {
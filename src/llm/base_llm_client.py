@@ -1,18 +1,55 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, AsyncIterator, Optional
+from functools import lru_cache
+import hashlib
 import os
 import openai
 import anthropic
-from huggingface_hub import InferenceClient
+from huggingface_hub import AsyncInferenceClient
 from src.config.model_config import ModelProvider, model_config
+from src.config.settings import CACHE_DIR, LLM_CACHE_MAX_TEMPERATURE
+from src.tools.cache import FileCache
+
+LLM_CACHE_TTL_SECONDS = 7 * 86400
+
+# Provider clients each hold their own HTTP connection pool. Agents and config
+# updates with the same credentials share one client so connections (and their
+# TLS sessions) are reused rather than re-established per client. The async
+# clients are used so that concurrent requests overlap instead of blocking the
+# event loop one at a time.
+@lru_cache(maxsize=16)
+def _openai_client(api_key: str) -> openai.AsyncOpenAI:
+    """Return the shared OpenAI client for an API key."""
+    return openai.AsyncOpenAI(api_key=api_key)
+
+@lru_cache(maxsize=16)
+def _anthropic_client(api_key: str) -> anthropic.AsyncAnthropic:
+    """Return the shared Anthropic client for an API key."""
+    return anthropic.AsyncAnthropic(api_key=api_key)
+
+@lru_cache(maxsize=16)
+def _huggingface_client(model: str, api_key: str) -> AsyncInferenceClient:
+    """Return the shared Hugging Face inference client for a model and token."""
+    return AsyncInferenceClient(model=model, token=api_key)
 
 class BaseLLMClient:
-    def __init__(self, agent_name: str):
+    def __init__(self, agent_name: str, cache_max_temperature: Optional[float] = None):
+        """
+        Initialize the client from an agent's model configuration.
+        
+        Args:
+            agent_name: Agent whose model configuration to use
+            cache_max_temperature: Highest temperature at which responses are
+                cached; defaults to the agent config's 'cache_max_temperature',
+                or LLM_CACHE_MAX_TEMPERATURE if it has none
+        """
         self.agent_name = agent_name
         self.config = model_config.get_agent_config(agent_name)
         self.provider = self.config["provider"]
         self.model = self.config["model"]
         self.temperature = self.config["temperature"]
         self.max_tokens = self.config["max_tokens"]
+        self._cache_max_temperature = cache_max_temperature
+        self.response_cache = FileCache(os.path.join(CACHE_DIR, "llm"), LLM_CACHE_TTL_SECONDS)
         
         # Initialize provider-specific clients
         self._initialize_provider()
@@ -25,63 +62,168 @@ class BaseLLMClient:
             api_key = os.getenv(provider_config["api_key_env_var"])
             if not api_key:
                 raise ValueError(f"Missing {provider_config['api_key_env_var']} environment variable")
-            openai.api_key = api_key
-            self.client = openai
+            self.client = _openai_client(api_key)
             
         elif self.provider == ModelProvider.ANTHROPIC:
             api_key = os.getenv(provider_config["api_key_env_var"])
             if not api_key:
                 raise ValueError(f"Missing {provider_config['api_key_env_var']} environment variable")
-            self.client = anthropic.Anthropic(api_key=api_key)
+            self.client = _anthropic_client(api_key)
             
         elif self.provider == ModelProvider.HUGGINGFACE:
             api_key = os.getenv(provider_config["api_key_env_var"])
             if not api_key:
                 raise ValueError(f"Missing {provider_config['api_key_env_var']} environment variable")
-            self.client = InferenceClient(model=self.model, token=api_key)
+            self.client = _huggingface_client(self.model, api_key)
             
         elif self.provider == ModelProvider.LOCAL:
             # Implement local model initialization here
             pass
         else:
             raise ValueError(f"Unsupported provider: {self.provider}")
+        
+        # Resolve the provider's request method once rather than on every call
+        self._generate_impl = {
+            ModelProvider.OPENAI: self._generate_openai,
+            ModelProvider.ANTHROPIC: self._generate_anthropic,
+            ModelProvider.HUGGINGFACE: self._generate_huggingface,
+            ModelProvider.LOCAL: self._generate_local
+        }[self.provider]
+
+    @property
+    def cache_max_temperature(self) -> float:
+        """Highest temperature at which generate caches responses by default."""
+        if self._cache_max_temperature is not None:
+            return self._cache_max_temperature
+        return self.config.get("cache_max_temperature", LLM_CACHE_MAX_TEMPERATURE)
+
+    def _response_cache_key(self, prompt: str, kwargs: Dict[str, Any]) -> str:
+        """Build a cache key covering everything that determines a response."""
+        settings = (self.provider.value, self.model, self.temperature, self.max_tokens, sorted(kwargs.items()))
+        digest = hashlib.blake2b(repr(settings).encode(), digest_size=16)
+        digest.update(prompt.encode())
+        return f"response_{digest.hexdigest()}"
+
+    async def generate(self, prompt: str, use_cache: Optional[bool] = None, **kwargs) -> str:
+        """
+        Generate a response from the LLM.
+        
+        Responses are cached on disk by prompt and model settings, so repeated
+        prompts skip the request. By default the cache is used when the
+        temperature is at most cache_max_temperature, which with the default
+        settings is the case for the universe, strategy and risk agents.
+        
+        Args:
+            prompt: Prompt to send
+            use_cache: Whether to reuse and store cached responses, overriding
+                the temperature rule for this call
+            **kwargs: Extra arguments passed to the provider
+            
+        Returns:
+            Generated text
+        """
+        if use_cache is None:
+            use_cache = self.temperature <= self.cache_max_temperature
+        if not use_cache:
+            return await self._generate_impl(prompt, **kwargs)
+        
+        cache_key = self._response_cache_key(prompt, kwargs)
+        response = self.response_cache.get(cache_key)
+        if response is None:
+            response = await self._generate_impl(prompt, **kwargs)
+            if response is not None:
+                self.response_cache.set(cache_key, response)
+        return response
+
+    async def _generate_openai(self, prompt: str, **kwargs) -> str:
+        """Send a prompt to OpenAI."""
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            **kwargs
+        )
+        return response.choices[0].message.content
 
-    async def generate(self, prompt: str, **kwargs) -> str:
-        """Generate a response from the LLM."""
+    async def _generate_anthropic(self, prompt: str, **kwargs) -> str:
+        """Send a prompt to Anthropic."""
+        response = await self.client.messages.create(
+            model=self.model,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            messages=[{"role": "user", "content": prompt}],
+            **kwargs
+        )
+        return response.content[0].text
+
+    async def _generate_huggingface(self, prompt: str, **kwargs) -> str:
+        """Send a prompt to the Hugging Face inference API."""
+        return await self.client.text_generation(
+            prompt,
+            max_new_tokens=self.max_tokens,
+            temperature=self.temperature,
+            **kwargs
+        )
+
+    async def _generate_local(self, prompt: str, **kwargs) -> Optional[str]:
+        """Send a prompt to a local model."""
+        # Implement local model generation here
+        return None
+
+    async def generate_stream(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """
+        Generate a response from the LLM, yielding text as it arrives.
+        
+        Streamed responses bypass the response cache.
+        
+        Args:
+            prompt: Prompt to send
+            **kwargs: Extra arguments passed to the provider
+            
+        Yields:
+            Successive pieces of the generated text
+        """
         if self.provider == ModelProvider.OPENAI:
-            response = await self.client.chat.completions.create(
+            stream = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=self.temperature,
                 max_tokens=self.max_tokens,
+                stream=True,
                 **kwargs
             )
-            return response.choices[0].message.content
-            
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                    
         elif self.provider == ModelProvider.ANTHROPIC:
-            response = await self.client.messages.create(
+            async with self.client.messages.stream(
                 model=self.model,
                 max_tokens=self.max_tokens,
                 temperature=self.temperature,
                 messages=[{"role": "user", "content": prompt}],
                 **kwargs
-            )
-            return response.content[0].text
-            
+            ) as stream:
+                async for text in stream.text_stream:
+                    yield text
+                    
         elif self.provider == ModelProvider.HUGGINGFACE:
-            response = self.client.text_generation(
+            stream = await self.client.text_generation(
                 prompt,
                 max_new_tokens=self.max_tokens,
                 temperature=self.temperature,
+                stream=True,
                 **kwargs
             )
-            return response
-            
-        elif self.provider == ModelProvider.LOCAL:
-            # Implement local model generation here
-            pass
+            async for token in stream:
+                yield token
+                
         else:
-            raise ValueError(f"Unsupported provider: {self.provider}")
+            # Providers without streaming support return the whole response at once
+            response = await self._generate_impl(prompt, **kwargs)
+            if response:
+                yield response
 
     def update_config(self, new_config: Dict[str, Any]) -> None:
         """Update the client's configuration."""
@@ -0,0 +1,64 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict
+
+from src.config.settings import LOG_DIR
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# File handlers by logger name, then by log file path. Only the listener
+# thread writes through them.
+_file_handlers: Dict[str, Dict[str, logging.FileHandler]] = {}
+_file_handlers_lock = threading.Lock()
+
+class _LoggerFileRouter(logging.Handler):
+    """Write each queued record to the log files registered for its logger."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        for handler in list(_file_handlers.get(record.name, {}).values()):
+            handler.handle(record)
+
+# Logging calls only enqueue records; a single background thread formats them
+# and does the file I/O, so callers (including pipeline worker threads) never
+# block on disk writes. Records still queued at exit are flushed by stop().
+_log_queue = queue.SimpleQueue()
+_listener = QueueListener(_log_queue, _LoggerFileRouter())
+_listener.start()
+atexit.register(_listener.stop)
+
+def get_logger(name: str, filename: str, level: int = logging.INFO) -> logging.Logger:
+    """
+    Get a module logger that writes to its own file under LOG_DIR.
+
+    The logger only holds a QueueHandler. The background listener routes each
+    record to the FileHandlers registered for the logger's name, which open
+    their file on the first record written.
+
+    Args:
+        name: Logger name, usually the module's __name__
+        filename: Log file name inside LOG_DIR
+        level: Logging level for the logger
+
+    Returns:
+        Configured logger
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    # Keep records out of the (unconfigured) root logger so they don't end up on stderr
+    logger.propagate = False
+
+    log_path = os.path.abspath(os.path.join(LOG_DIR, filename))
+    with _file_handlers_lock:
+        handlers = _file_handlers.setdefault(name, {})
+        if log_path not in handlers:
+            handler = logging.FileHandler(log_path, delay=True)
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            handlers[log_path] = handler
+
+    if not any(isinstance(handler, QueueHandler) for handler in logger.handlers):
+        logger.addHandler(QueueHandler(_log_queue))
+    return logger
@@ -1,103 +1,209 @@
-import logging
-import os
+import contextlib
+import importlib
+import io
+import re
 import sys
-from typing import List, Dict, Optional
+import threading
+from typing import TYPE_CHECKING, Any, Container, List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 import pandas as pd
 import argparse
 import asyncio
 
-from src.agents.data_aggregation_agent import DataAggregationAgent
-from src.agents.universe_definition_agent import UniverseDefinitionAgent
-from src.agents.research_agent import ResearchAgent
-from src.agents.strategy_agent import StrategyAgent
-from src.agents.risk_agent import RiskAgent
-from src.agents.play_agent import PlayAgent
-from src.config.settings import LOG_DIR, CACHE_DIR, DATA_PERIOD, DATA_INTERVAL, BACKTEST_START_DATE, BACKTEST_END_DATE
+from src.config.settings import CACHE_DIR, DATA_PERIOD, DATA_INTERVAL, BACKTEST_START_DATE, BACKTEST_END_DATE
 from src.config.model_config import ModelProvider, model_config
-
-# Set up logging
-os.makedirs(LOG_DIR, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(LOG_DIR, 'main.log'),
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+from src.logging_setup import get_logger
+
+if TYPE_CHECKING:
+    from src.agents.data_aggregation_agent import DataAggregationAgent
+    from src.agents.universe_definition_agent import UniverseDefinitionAgent
+    from src.agents.research_agent import ResearchAgent
+    from src.agents.strategy_agent import StrategyAgent
+    from src.agents.risk_agent import RiskAgent
+    from src.agents.play_agent import PlayAgent
+
+logger = get_logger(__name__, 'main.log')
+
+# Agents by name as (module, class, takes the shared data agent). They are
+# imported and constructed on first use: together they pull in yfinance,
+# numba, scipy and the LLM SDKs, which takes seconds, and the configuration
+# menu needs none of them.
+_AGENT_CLASSES = {
+    "data": ("src.agents.data_aggregation_agent", "DataAggregationAgent", False),
+    "universe": ("src.agents.universe_definition_agent", "UniverseDefinitionAgent", True),
+    "research": ("src.agents.research_agent", "ResearchAgent", False),
+    "strategy": ("src.agents.strategy_agent", "StrategyAgent", True),
+    "risk": ("src.agents.risk_agent", "RiskAgent", True),
+    "play": ("src.agents.play_agent", "PlayAgent", True)
+}
+
+# Agents listed in the LLM configuration menu
+_CONFIGURABLE_AGENTS = ("research", "universe", "strategy", "risk", "play")
+
+# Choices accepted by the interactive prompts. Periods and intervals keep their
+# order for the settings menus; the sets give constant-time validation.
+_PERIODS = ('1d', '5d', '1mo', '3mo', '6mo', '1y', '2y', '5y', '10y', 'ytd', 'max')
+_INTERVALS = ('1m', '2m', '5m', '15m', '30m', '60m', '90m', '1h', '1d', '5d', '1wk', '1mo', '3mo')
+_VALID_PERIODS = frozenset(_PERIODS)
+_VALID_INTERVALS = frozenset(_INTERVALS)
+_VALID_STRATEGIES = frozenset({'momentum', 'mean_reversion', 'value', 'growth'})
+_VALID_RISK_TOLERANCES = frozenset({'low', 'medium', 'high'})
+_VALID_TIME_HORIZONS = frozenset({'short', 'medium', 'long'})
+
+# Providers by the name users type in configure_llm
+_PROVIDERS_BY_VALUE = {provider.value: provider for provider in ModelProvider}
+
+# Tickers in user input, separated by commas and/or whitespace. Symbols keep
+# their punctuation ("BRK-B", "^GSPC", "EURUSD=X").
+_TICKER_PATTERN = re.compile(r'[^,\s]+')
 
 class StockAgentsCLI:
+    # Fixed attribute set: no per-instance __dict__, and a mistyped attribute
+    # assignment raises instead of silently creating new state
+    __slots__ = (
+        '_agents',
+        '_agents_lock',
+        'current_data',
+        'current_universe',
+        '_universe_matrix_cache',
+        'data_settings'
+    )
+
     def __init__(self):
-        """Initialize the CLI with all agents."""
-        self.data_agent = DataAggregationAgent()
-        self.universe_agent = UniverseDefinitionAgent()
-        self.research_agent = ResearchAgent()
-        self.strategy_agent = StrategyAgent()
-        self.risk_agent = RiskAgent()
-        self.play_agent = PlayAgent()
+        """Initialize the CLI; agents are created when first used."""
+        # Agents created so far, by name. One of each, so LLM configuration
+        # changes apply to the agents the CLI actually runs and every agent
+        # shares the data agent's caches.
+        self._agents = {}
+        # Reentrant, since building an agent first builds the data agent.
+        # Pipeline stages running in worker threads may create agents at once.
+        self._agents_lock = threading.RLock()
         self.current_data = None
         self.current_universe = None
-        self.agents = {
-            "research": ResearchAgent(),
-            "universe": UniverseDefinitionAgent(),
-            "strategy": StrategyAgent(),
-            "risk": RiskAgent(),
-            "play": PlayAgent()
-        }
+        # (universe, closes, returns) for the last universe analyzed; see _universe_matrices
+        self._universe_matrix_cache = None
         self.data_settings = {
             "period": DATA_PERIOD,
             "interval": DATA_INTERVAL,
             "backtest_start": BACKTEST_START_DATE,
             "backtest_end": BACKTEST_END_DATE
         }
-        logger.info("CLI initialized with all agents")
+        logger.info("CLI initialized")
+
+    def _agent(self, name: str) -> Any:
+        """
+        Get an agent by name, importing and constructing it on first use.
+        
+        Args:
+            name: Key of the agent in _AGENT_CLASSES
+            
+        Returns:
+            The CLI's instance of that agent
+        """
+        with self._agents_lock:
+            agent = self._agents.get(name)
+            if agent is None:
+                module_name, class_name, takes_data_agent = _AGENT_CLASSES[name]
+                agent_class = getattr(importlib.import_module(module_name), class_name)
+                agent = agent_class(self.data_agent) if takes_data_agent else agent_class()
+                self._agents[name] = agent
+            return agent
+
+    @property
+    def data_agent(self) -> 'DataAggregationAgent':
+        """Data agent shared by all other agents."""
+        return self._agent("data")
+
+    @property
+    def universe_agent(self) -> 'UniverseDefinitionAgent':
+        """Universe definition agent."""
+        return self._agent("universe")
+
+    @property
+    def research_agent(self) -> 'ResearchAgent':
+        """Research agent."""
+        return self._agent("research")
+
+    @property
+    def strategy_agent(self) -> 'StrategyAgent':
+        """Strategy agent."""
+        return self._agent("strategy")
+
+    @property
+    def risk_agent(self) -> 'RiskAgent':
+        """Risk agent."""
+        return self._agent("risk")
+
+    @property
+    def play_agent(self) -> 'PlayAgent':
+        """Play agent."""
+        return self._agent("play")
+
+    def _prompt_choice(self, prompt: str, choices: Container[str], error: str) -> str:
+        """
+        Prompt until the user enters one of the given choices.
+        
+        Args:
+            prompt: Text shown to the user
+            choices: Accepted answers, in lower case
+            error: Message printed after an invalid answer
+            
+        Returns:
+            The accepted answer, stripped and lower-cased
+        """
+        while (choice := input(prompt).strip().lower()) not in choices:
+            print(error)
+        return choice
 
     def prompt_for_tickers(self) -> List[str]:
         """Prompt user for stock tickers."""
         while True:
-            tickers = input("\nEnter stock tickers (comma-separated): ").strip().upper()
+            raw = input("\nEnter stock tickers (comma-separated): ").upper()
+            # Interned tickers make the many per-ticker dict lookups identity compares
+            tickers = [sys.intern(t) for t in _TICKER_PATTERN.findall(raw)]
             if tickers:
-                return [t.strip() for t in tickers.split(',')]
+                return tickers
             print("Please enter at least one ticker.")
 
     def prompt_for_period(self) -> str:
         """Prompt user for data period."""
-        while True:
-            period = input("\nEnter data period (e.g., 1y, 6mo, 1mo): ").strip().lower()
-            if period in ['1d', '5d', '1mo', '3mo', '6mo', '1y', '2y', '5y', '10y', 'ytd', 'max']:
-                return period
-            print("Invalid period. Please try again.")
+        return self._prompt_choice(
+            "\nEnter data period (e.g., 1y, 6mo, 1mo): ",
+            _VALID_PERIODS,
+            "Invalid period. Please try again."
+        )
 
     def prompt_for_interval(self) -> str:
         """Prompt user for data interval."""
-        while True:
-            interval = input("\nEnter data interval (e.g., 1d, 1h, 5m): ").strip().lower()
-            if interval in ['1m', '2m', '5m', '15m', '30m', '60m', '90m', '1h', '1d', '5d', '1wk', '1mo', '3mo']:
-                return interval
-            print("Invalid interval. Please try again.")
+        return self._prompt_choice(
+            "\nEnter data interval (e.g., 1d, 1h, 5m): ",
+            _VALID_INTERVALS,
+            "Invalid interval. Please try again."
+        )
 
     def prompt_for_strategy(self) -> str:
         """Prompt user for universe strategy."""
-        while True:
-            strategy = input("\nEnter strategy (momentum/mean_reversion/value/growth): ").strip().lower()
-            if strategy in ['momentum', 'mean_reversion', 'value', 'growth']:
-                return strategy
-            print("Invalid strategy. Please try again.")
+        return self._prompt_choice(
+            "\nEnter strategy (momentum/mean_reversion/value/growth): ",
+            _VALID_STRATEGIES,
+            "Invalid strategy. Please try again."
+        )
 
     def prompt_for_risk_tolerance(self) -> str:
         """Prompt user for risk tolerance."""
-        while True:
-            risk = input("\nEnter risk tolerance (low/medium/high): ").strip().lower()
-            if risk in ['low', 'medium', 'high']:
-                return risk
-            print("Invalid risk tolerance. Please try again.")
+        return self._prompt_choice(
+            "\nEnter risk tolerance (low/medium/high): ",
+            _VALID_RISK_TOLERANCES,
+            "Invalid risk tolerance. Please try again."
+        )
 
     def prompt_for_time_horizon(self) -> str:
         """Prompt user for time horizon."""
-        while True:
-            horizon = input("\nEnter time horizon (short/medium/long): ").strip().lower()
-            if horizon in ['short', 'medium', 'long']:
-                return horizon
-            print("Invalid time horizon. Please try again.")
+        return self._prompt_choice(
+            "\nEnter time horizon (short/medium/long): ",
+            _VALID_TIME_HORIZONS,
+            "Invalid time horizon. Please try again."
+        )
 
     def prompt_for_max_positions(self) -> int:
         """Prompt user for maximum positions."""
@@ -137,28 +243,34 @@ class StockAgentsCLI:
             logger.error(f"Error defining universe: {str(e)}")
             print(f"Error: {str(e)}")
 
-    def research_universe(self) -> None:
+    async def research_universe(self) -> None:
         """Generate research report for a universe."""
         try:
             if not self.current_universe:
                 print("No universe defined. Please define a universe first.")
                 return
             
-            report = self.research_agent.generate_research_report(self.current_universe)
+            report = await self.research_agent.generate_research_report(self.current_universe)
             print("\nGenerated research report")
             # TODO: Add formatted report printing
         except Exception as e:
             logger.error(f"Error generating research report: {str(e)}")
             print(f"Error: {str(e)}")
 
-    def backtest_strategy(self) -> None:
-        """Backtest a strategy on universe data."""
+    def backtest_strategy(self, strategy: Optional[str] = None) -> None:
+        """
+        Backtest a strategy on universe data.
+        
+        Args:
+            strategy: Strategy to backtest; prompted for if not given
+        """
         try:
             if not self.current_universe:
                 print("No universe defined. Please define a universe first.")
                 return
             
-            strategy = self.prompt_for_strategy()
+            if strategy is None:
+                strategy = self.prompt_for_strategy()
             if strategy == "momentum":
                 results = self.strategy_agent.backtest_momentum_strategy(self.current_universe)
             else:
@@ -169,6 +281,27 @@ class StockAgentsCLI:
             logger.error(f"Error backtesting strategy: {str(e)}")
             print(f"Error: {str(e)}")
 
+    def _universe_matrices(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Get the close matrix of the current universe and its returns.
+        
+        Both are built once per universe and shared by the risk analysis and
+        the trade recommendations instead of each rebuilding them from the
+        per-ticker frames.
+        
+        Returns:
+            Tuple of the (n_bars, n_tickers) close matrix and its returns with
+            missing rows dropped
+        """
+        universe, closes, returns = self._universe_matrix_cache or (None, None, None)
+        if universe is not self.current_universe:
+            # Imported on first use like the agents; see _AGENT_CLASSES
+            from src.agents.play_agent import build_close_matrix
+            closes = build_close_matrix(self.current_universe)
+            returns = closes.pct_change().dropna()
+            self._universe_matrix_cache = (self.current_universe, closes, returns)
+        return closes, returns
+
     def analyze_risk(self) -> None:
         """Analyze risk metrics for a universe."""
         try:
@@ -176,10 +309,7 @@ class StockAgentsCLI:
                 print("No universe defined. Please define a universe first.")
                 return
             
-            returns = pd.DataFrame()
-            for ticker, data in self.current_universe.items():
-                returns[ticker] = data['Close'].pct_change()
-            returns = returns.dropna()
+            _, returns = self._universe_matrices()
             
             risk_metrics = self.risk_agent.calculate_portfolio_risk(returns)
             correlation = self.risk_agent.calculate_correlation_matrix(returns)
@@ -190,24 +320,38 @@ class StockAgentsCLI:
             logger.error(f"Error analyzing risk: {str(e)}")
             print(f"Error: {str(e)}")
 
-    def generate_recommendations(self) -> None:
+    async def generate_recommendations(self) -> None:
         """Generate trade recommendations."""
         try:
             if not self.current_universe:
                 print("No universe defined. Please define a universe first.")
                 return
             
+            closes, returns = self._universe_matrices()
             risk_tolerance = self.prompt_for_risk_tolerance()
             time_horizon = self.prompt_for_time_horizon()
             max_positions = self.prompt_for_max_positions()
             
-            recommendations = self.play_agent.generate_trade_recommendations(
+            # Print the recommendations as soon as they are computed instead of
+            # waiting for the research report that accompanies them
+            printed = False
+            
+            def show(recommendations: Dict) -> None:
+                nonlocal printed
+                printed = True
+                self.print_recommendations(recommendations)
+            
+            recommendations = await self.play_agent.generate_trade_recommendations(
                 self.current_universe,
                 risk_tolerance,
                 time_horizon,
-                max_positions
+                max_positions,
+                on_recommendations=show,
+                closes=closes,
+                returns=returns
             )
-            self.print_recommendations(recommendations)
+            if not printed:
+                self.print_recommendations(recommendations)
         except Exception as e:
             logger.error(f"Error generating recommendations: {str(e)}")
             print(f"Error: {str(e)}")
@@ -218,27 +362,32 @@ class StockAgentsCLI:
             print("No recommendations available.")
             return
 
-        print("\nTrade Recommendations:")
-        print("=" * 50)
+        # Build the whole report and write it at once rather than a print per line
+        lines = ["\nTrade Recommendations:", "=" * 50]
         for rec in recommendations['recommendations']:
-            print(f"\n{rec['ticker']}:")
-            print(f"Action: {rec['action']}")
-            print(f"Reason: {rec['reason']}")
-            print(f"Price: ${rec['price']:.2f}")
-            print(f"Position Size: {rec['position_size']:.1%}")
-            print(f"Volatility: {rec['volatility']:.1%}")
-            print(f"Beta: {rec['beta']:.2f}")
-            print(f"RSI: {rec['rsi']:.1f}")
-            print("-" * 30)
-
-        print("\nPortfolio Risk Metrics:")
-        print("=" * 50)
-        risk = recommendations['portfolio_risk']
-        print(f"Volatility: {risk['volatility']:.1%}")
-        print(f"VaR (95%): {risk['var_95']:.1%}")
-        print(f"Max Drawdown: {risk['max_drawdown']:.1%}")
+            lines.append(
+                f"\n{rec['ticker']}:\n"
+                f"Action: {rec['action']}\n"
+                f"Reason: {rec['reason']}\n"
+                f"Price: ${rec['price']:.2f}\n"
+                f"Position Size: {rec['position_size']:.1%}\n"
+                f"Volatility: {rec['volatility']:.1%}\n"
+                f"Beta: {rec['beta']:.2f}\n"
+                f"RSI: {rec['rsi']:.1f}\n"
+                + "-" * 30
+            )
 
-    def run_pipeline(self) -> None:
+        risk = recommendations['portfolio_risk']
+        lines += [
+            "\nPortfolio Risk Metrics:",
+            "=" * 50,
+            f"Volatility: {risk['volatility']:.1%}",
+            f"VaR (95%): {risk['var_95']:.1%}",
+            f"Max Drawdown: {risk['max_drawdown']:.1%}"
+        ]
+        sys.stdout.write("\n".join(lines) + "\n")
+
+    async def run_pipeline(self) -> None:
         """Run the full analysis pipeline."""
         print("\nRunning full analysis pipeline...")
         
@@ -256,21 +405,28 @@ class StockAgentsCLI:
             print("Error defining universe. Exiting.")
             return
         
-        # 3. Research
-        print("\n3. Generating research report...")
-        self.research_universe()
-        
-        # 4. Backtest
-        print("\n4. Backtesting strategy...")
-        self.backtest_strategy()
-        
-        # 5. Risk analysis
-        print("\n5. Analyzing risk...")
-        self.analyze_risk()
+        # 3-5. Research, backtest and risk analysis only read the universe, so
+        # they run concurrently: the report waits on the LLM while the backtest
+        # and risk calculations run in worker threads. Each stage reports its
+        # own errors, so one failing stage does not stop the others.
+        # Their status lines are collected and written in one go once all
+        # three finish. The other stages prompt for input, so their output
+        # is left unbuffered.
+        strategy = self.prompt_for_strategy()
+        print("\n3-5. Generating research report, backtesting strategy and analyzing risk...")
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            await asyncio.gather(
+                self.research_universe(),
+                asyncio.to_thread(self.backtest_strategy, strategy),
+                asyncio.to_thread(self.analyze_risk)
+            )
+        sys.stdout.write(output.getvalue())
+        sys.stdout.flush()
         
         # 6. Generate recommendations
         print("\n6. Generating recommendations...")
-        self.generate_recommendations()
+        await self.generate_recommendations()
 
     async def configure_data_settings(self) -> None:
         """Configure data frequency and date range settings."""
@@ -278,7 +434,7 @@ class StockAgentsCLI:
         
         # Configure data period
         print("\nAvailable data periods:")
-        periods = ["1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "ytd", "max"]
+        periods = _PERIODS
         for i, period in enumerate(periods, 1):
             print(f"{i}. {period}")
         
@@ -294,7 +450,7 @@ class StockAgentsCLI:
 
         # Configure data interval
         print("\nAvailable data intervals:")
-        intervals = ["1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h", "1d", "5d", "1wk", "1mo", "3mo"]
+        intervals = _INTERVALS
         for i, interval in enumerate(intervals, 1):
             print(f"{i}. {interval}")
         
@@ -320,7 +476,7 @@ class StockAgentsCLI:
 
     async def configure_llm(self, agent_name: str) -> None:
         """Configure LLM settings for a specific agent through interactive prompts."""
-        if agent_name not in self.agents:
+        if agent_name not in _CONFIGURABLE_AGENTS:
             print(f"Unknown agent: {agent_name}")
             return
 
@@ -330,13 +486,9 @@ class StockAgentsCLI:
             print(f"- {provider.value}")
 
         # Get provider
-        while True:
-            provider = input("\nSelect provider: ").strip().lower()
-            try:
-                provider = ModelProvider(provider)
-                break
-            except ValueError:
-                print("Invalid provider. Please try again.")
+        provider = _PROVIDERS_BY_VALUE[
+            self._prompt_choice("\nSelect provider: ", _PROVIDERS_BY_VALUE, "Invalid provider. Please try again.")
+        ]
 
         # Get model
         provider_config = model_config.get_provider_config(provider)
@@ -376,7 +528,7 @@ class StockAgentsCLI:
             "max_tokens": max_tokens
         }
 
-        self.agents[agent_name].update_llm_config(new_config)
+        self._agent(agent_name).update_llm_config(new_config)
         print(f"\nSuccessfully updated {agent_name} agent configuration:")
         print(f"Provider: {provider.value}")
         print(f"Model: {model}")
@@ -393,7 +545,7 @@ class StockAgentsCLI:
         print(f"Backtest Range: {self.data_settings['backtest_start']} to {self.data_settings['backtest_end']}")
         
         print("\nLLM Configurations:")
-        for agent_name, agent in self.agents.items():
+        for agent_name in _CONFIGURABLE_AGENTS:
             config = model_config.get_agent_config(agent_name)
             print(f"\n{agent_name} agent:")
             print(f"  Provider: {config['provider'].value}")
@@ -416,7 +568,7 @@ class StockAgentsCLI:
                 await self.configure_data_settings()
             elif choice == "2":
                 print("\nAvailable agents:")
-                for agent in self.agents.keys():
+                for agent in _CONFIGURABLE_AGENTS:
                     print(f"- {agent}")
                 agent_name = input("\nSelect agent to configure: ").strip()
                 await self.configure_llm(agent_name)
@@ -0,0 +1,59 @@
+import json
+import os
+import time
+from typing import Any, Optional
+
+from src.config.settings import CACHE_DIR
+
+class FileCache:
+    def __init__(self, dir: str = CACHE_DIR, ttl_seconds: int = 86400):
+        """
+        Initialize a JSON file cache shared across processes.
+        
+        Args:
+            dir: Directory the cache files are written to
+            ttl_seconds: Maximum age of an entry before it is treated as missing
+        """
+        self.dir = dir
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(self.dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        """Return the file path for a cache key."""
+        return os.path.join(self.dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Get a cached value.
+        
+        Args:
+            key: Cache key
+            
+        Returns:
+            The cached value, or None if it is missing, expired or unreadable
+        """
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) >= self.ttl_seconds:
+                return None
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Store a value in the cache.
+        
+        Values that JSON can't represent (dates, timestamps) are stored as strings.
+        
+        Args:
+            key: Cache key
+            value: JSON-serializable value
+        """
+        path = self._path(key)
+        # Write to a temporary file first so concurrent readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(value, f, default=str)
+        os.replace(tmp_path, path)
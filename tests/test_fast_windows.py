@@ -0,0 +1,22 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.agents._fast_windows import max_drawdown
+
+class MaxDrawdownTest(unittest.TestCase):
+    def test_missing_returns_are_skipped(self):
+        returns = np.random.default_rng(1).normal(0.0, 0.02, 300)
+        returns[[5, 100, 101]] = np.nan
+        
+        wealth = (1 + pd.Series(returns)).cumprod()
+        expected = (wealth / wealth.cummax() - 1).min()
+        self.assertAlmostEqual(max_drawdown(returns), expected, places=12)
+
+    def test_series_without_valid_returns_is_nan(self):
+        self.assertTrue(np.isnan(max_drawdown(np.array([]))))
+        self.assertTrue(np.isnan(max_drawdown(np.full(4, np.nan))))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.agents.risk_agent import RiskAgent
+
+def _sample_returns(n_obs: int = 250, n_assets: int = 3, seed: int = 0) -> pd.DataFrame:
+    """Daily returns for a few synthetic assets."""
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2023-01-02", periods=n_obs, freq="B")
+    return pd.DataFrame(rng.normal(0.0005, 0.02, (n_obs, n_assets)), index=index, columns=["A", "B", "C"][:n_assets])
+
+class PortfolioRiskMissingReturnsTest(unittest.TestCase):
+    def setUp(self):
+        # The risk agent only needs a data agent for fetching, which these tests never do
+        self.agent = RiskAgent(data_agent=object())
+
+    def test_missing_return_is_skipped_like_weighted_sum(self):
+        returns = _sample_returns()
+        returns.iloc[10, 1] = np.nan
+        weights = [1 / 3] * 3
+        
+        risk = self.agent.calculate_portfolio_risk(returns)
+        
+        # Reference: the NaN-skipping pandas formulation
+        portfolio = (returns * weights).sum(axis=1)
+        wealth = (1 + portfolio).cumprod()
+        expected_drawdown = (wealth / wealth.cummax() - 1).min()
+        self.assertAlmostEqual(risk['volatility'], portfolio.std() * np.sqrt(252), places=5)
+        self.assertAlmostEqual(risk['sharpe_ratio'], portfolio.mean() / portfolio.std() * np.sqrt(252), places=4)
+        self.assertAlmostEqual(risk['max_drawdown'], expected_drawdown, places=5)
+
+class PublicResultTypesTest(unittest.TestCase):
+    def setUp(self):
+        self.agent = RiskAgent(data_agent=object())
+        self.returns = _sample_returns()
+
+    def test_scalar_results_are_python_floats(self):
+        weights = [1 / 3] * 3
+        
+        self.assertIs(type(self.agent.calculate_var(self.returns['A'])), float)
+        self.assertIs(type(self.agent.calculate_expected_shortfall(self.returns['A'])), float)
+        self.assertIs(type(self.agent.calculate_beta(self.returns['A'], self.returns['B'])), float)
+        results = [
+            self.agent.calculate_portfolio_risk(self.returns),
+            self.agent.calculate_betas(self.returns),
+            self.agent.calculate_risk_contribution(self.returns, weights),
+            *self.agent.stress_test_portfolio(self.returns, weights, {'crash': -0.2}).values()
+        ]
+        for result in results:
+            self.assertTrue(result)
+            for value in result.values():
+                self.assertIs(type(value), float)
+
+class CorrelationMatrixTest(unittest.TestCase):
+    def test_dtype_does_not_depend_on_missing_values(self):
+        agent = RiskAgent(data_agent=object())
+        returns = _sample_returns()
+        with_gap = returns.copy()
+        with_gap.iloc[10, 1] = np.nan
+        
+        complete = agent.calculate_correlation_matrix(returns)
+        gapped = agent.calculate_correlation_matrix(with_gap)
+        self.assertEqual(set(complete.dtypes), set(gapped.dtypes))
+        np.testing.assert_allclose(gapped.to_numpy(), with_gap.corr().to_numpy(), atol=1e-6)
+
+class BetaTest(unittest.TestCase):
+    def test_single_beta_matches_calculate_betas(self):
+        agent = RiskAgent(data_agent=object())
+        returns = _sample_returns()
+        market = returns.mean(axis=1)
+        
+        betas = agent.calculate_betas(returns, market)
+        for asset in returns.columns:
+            self.assertEqual(agent.calculate_beta(returns[asset], market), betas[asset])
+        self.assertAlmostEqual(betas['A'], returns['A'].cov(market) / market.var(), places=5)
+
+class MonteCarloVarTest(unittest.TestCase):
+    def setUp(self):
+        self.agent = RiskAgent(data_agent=object())
+        # Unequal variances and strong correlations, so that a wrongly
+        # transposed Cholesky factor gives a visibly different VaR
+        covariance = np.array([[4.0, 1.6, -0.4], [1.6, 1.0, 0.1], [-0.4, 0.1, 0.25]]) * 1e-4
+        rng = np.random.default_rng(3)
+        self.returns = pd.DataFrame(rng.multivariate_normal([0.0005, 0.0002, 0.0008], covariance, 2000))
+        self.weights = [0.2, 0.3, 0.5]
+
+    def test_seeded_portfolio_var_matches_parametric(self):
+        var = self.agent.calculate_var(
+            self.returns, method='monte_carlo', n_sims=200_000, weights=self.weights, seed=7
+        )
+        
+        # The simulation uses the sample covariance, so it converges to the
+        # normal VaR of the weighted portfolio returns
+        portfolio = self.returns @ self.weights
+        expected = self.agent.calculate_var(portfolio, method='parametric')
+        self.assertAlmostEqual(var / expected, 1.0, delta=0.02)
+
+    def test_seed_makes_var_reproducible(self):
+        runs = [
+            self.agent.calculate_var(self.returns, method='monte_carlo', weights=self.weights, seed=11)
+            for _ in range(2)
+        ]
+        self.assertEqual(runs[0], runs[1])
+
+if __name__ == "__main__":
+    unittest.main()